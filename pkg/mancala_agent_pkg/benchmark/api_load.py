@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+import numpy as np
+
+from pkg.mancala_agent_pkg.benchmark.history import record_and_compare, result
+
+ROUTES = ["initial_state", "next_state", "next_move", "play_move"]
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, route: str, latency: float, is_error: bool):
+        self.latencies[route].append(latency)
+        if is_error:
+            self.errors[route] += 1
+
+    def summarise(self, elapsed: float) -> dict:
+        results = {}
+        for route in ROUTES:
+            latencies = self.latencies[route]
+            if not latencies:
+                continue
+
+            p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+            results[f"{route}.throughput"] = result(len(latencies) / elapsed, "req/s")
+            results[f"{route}.p50"] = result(p50, "ms", higher_is_better=False)
+            results[f"{route}.p95"] = result(p95, "ms", higher_is_better=False)
+            results[f"{route}.p99"] = result(p99, "ms", higher_is_better=False)
+            results[f"{route}.error_rate"] = result(
+                self.errors[route] / len(latencies), "ratio", higher_is_better=False
+            )
+
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        results["total.throughput"] = result(total / elapsed, "req/s")
+        return results
+
+
+def is_game_over(state: dict) -> bool:
+    return sum(state["player_side"]) == 0 or sum(state["opponent_side"]) == 0
+
+
+async def timed_request(
+    client: httpx.AsyncClient, stats: LoadStats, route: str, method: str, **kwargs
+) -> dict | None:
+    start = time.perf_counter()
+    response = await client.request(method, f"/api/{route}", **kwargs)
+    stats.record(route, time.perf_counter() - start, response.status_code != 200)
+
+    if response.status_code != 200:
+        return None
+    return response.json()
+
+
+async def play_simulated_game(
+    client: httpx.AsyncClient,
+    stats: LoadStats,
+    rng: np.random.Generator,
+    play_move_ratio: float,
+):
+    """
+    Plays a game the way the UI does: the agent's turns are a next_move then a next_state, and
+    the human's turns are either a play_move (which also plays the agent's reply) or a next_state.
+    """
+    body = await timed_request(
+        client,
+        stats,
+        "initial_state",
+        "GET",
+        params={"is_agent_turn": bool(rng.integers(0, 2))},
+    )
+
+    while body is not None and not is_game_over(body["current_state"]):
+        current_state = body["current_state"]
+
+        if current_state["opponent_to_start"]:
+            move = await timed_request(
+                client,
+                stats,
+                "next_move",
+                "POST",
+                json={"current-state": current_state},
+            )
+            if move is None:
+                return
+            route, action = "next_state", move["action"]
+        else:
+            route = "play_move" if rng.random() < play_move_ratio else "next_state"
+            action = int(rng.choice(body["metadata"]["allowed_moves"]))
+
+        body = await timed_request(
+            client,
+            stats,
+            route,
+            "POST",
+            json={"current-state": current_state, "action": action},
+        )
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    n_games: int,
+    concurrency: int,
+    play_move_ratio: float,
+    seed: int,
+) -> dict:
+    stats = LoadStats()
+    games = iter(range(n_games))
+    rng = np.random.default_rng(seed)
+
+    async def run_client(client_rng: np.random.Generator):
+        for _ in games:
+            await play_simulated_game(client, stats, client_rng, play_move_ratio)
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(run_client(client_rng) for client_rng in rng.spawn(concurrency))
+    )
+    return stats.summarise(time.perf_counter() - start)
+
+
+def get_client(url: str | None) -> httpx.AsyncClient:
+    if url is not None:
+        return httpx.AsyncClient(base_url=url, timeout=60)
+
+    # Imported here so that driving a remote server doesn't pay for loading the app
+    from pkg.mancala_agent_pkg.inference_api.server import app
+
+    # Unhandled errors in the app count as failed requests, as they would for a real server
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app, raise_app_exceptions=False),
+        base_url="http://load-test",
+        timeout=60,
+    )
+
+
+async def main_async(args: argparse.Namespace) -> dict:
+    async with get_client(args.url) as client:
+        return await run_load(
+            client, args.n_games, args.concurrency, args.play_move_ratio, args.seed
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--url",
+        type=str,
+        default=None,
+        help="Base url of a running server, e.g. http://localhost:8000. Drives the app "
+        "in-process if not given",
+    )
+    parser.add_argument(
+        "--n-games", type=int, default=200, help="Number of simulated games to play"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=16, help="Number of concurrent clients"
+    )
+    parser.add_argument(
+        "--play-move-ratio",
+        type=float,
+        default=0.7,
+        help="Fraction of human turns sent as play_move rather than next_state",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--history",
+        type=str,
+        default="./benchmark_results/api.json",
+        help="JSON file of previous results to compare against and append to",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Fractional change for the worse versus the previous run that counts as a "
+        "regression",
+    )
+    parser.add_argument(
+        "--no-record",
+        action="store_true",
+        default=False,
+        help="Compare against the history without appending this run to it",
+    )
+    args = parser.parse_args()
+
+    regressions = record_and_compare(
+        args.history,
+        asyncio.run(main_async(args)),
+        args.threshold,
+        record=not args.no_record,
+    )
+
+    if regressions:
+        print("\nRegressions:")
+        print("\n".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
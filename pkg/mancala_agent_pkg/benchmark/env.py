@@ -0,0 +1,333 @@
+import argparse
+import os
+import sys
+
+import gymnasium as gym
+import numpy as np
+
+import mancala_env  # noqa: F401 is used
+from mancala_env.envs.mancala import make_valid_action
+import pkg.mancala_agent_pkg.model.opponent_policy as op
+from pkg.mancala_agent_pkg.benchmark.history import record_and_compare, result
+from pkg.mancala_agent_pkg.benchmark.timing import measure_rate
+
+N_POSITIONS = 1_000
+
+
+def get_env() -> mancala_env.MancalaEnv:
+    return gym.make(
+        "Mancala-v0",
+        max_episode_steps=100,
+        opponent_policy=op.random_opponent_policy,
+    ).unwrapped
+
+
+def play_random_step(env: mancala_env.MancalaEnv) -> bool:
+    """
+    Plays a random move with the env's own generator, so seeded runs are reproducible.
+
+    Returns: Whether the game finished on this step
+    """
+    _, _, terminated, truncated, _ = env.step(
+        op.get_random_valid_move(env._get_obs()[:6], env.np_random)
+    )
+    return terminated or truncated
+
+
+def sample_positions(n_positions: int) -> list[np.array]:
+    """
+    Returns: Observations from the player's perspective with at least one valid move, taken from
+    random games
+    """
+    env = get_env()
+    env.reset(seed=0)
+    positions = []
+    while len(positions) < n_positions:
+        positions.append(env._get_obs())
+        if play_random_step(env):
+            env.reset()
+    return positions
+
+
+def bench_make_valid_action(positions: list[np.array]) -> dict:
+    rng = np.random.default_rng(0)
+    moves = [
+        (
+            op.get_random_valid_move(obs[:6], rng),
+            obs[:6].tolist(),
+            int(obs[6]),
+            obs[7:13].tolist(),
+        )
+        for obs in positions
+    ]
+
+    def run():
+        for action, side, score, opponent_side in moves:
+            # make_valid_action mutates the sides, so play on copies
+            make_valid_action(action, side.copy(), score, opponent_side.copy())
+
+    return result(measure_rate(run, len(moves)), "moves/s")
+
+
+def bench_kernel(positions: list[np.array]) -> dict:
+    """
+    The rules kernel, one board at a time and in batches, compiled if Numba is installed
+    """
+    from mancala_env.envs import kernel
+
+    boards = np.array(positions)
+    actions = op.get_random_valid_moves(boards[:, :6], np.random.default_rng(0))
+    # Compile before timing
+    kernel.apply_moves(boards[:1].copy(), actions[:1])
+    kernel.apply_move(boards[0].copy(), int(actions[0]))
+
+    def run_single():
+        for board, action in zip(boards.copy(), actions):
+            kernel.apply_move(board, action)
+
+    def run_batch():
+        kernel.apply_moves(boards.copy(), actions)
+
+    engine = "jit" if kernel.HAS_JIT else "python"
+    return {
+        f"kernel[{engine}].apply_move": result(
+            measure_rate(run_single, len(boards)), "moves/s"
+        ),
+        f"kernel[{engine}].apply_moves": result(
+            measure_rate(run_batch, len(boards)), "moves/s"
+        ),
+    }
+
+
+def bench_random_valid_moves(positions: list[np.array]) -> dict:
+    sides = np.array(positions)[:, :6]
+    rng = np.random.default_rng(0)
+
+    def run_single():
+        for side in sides:
+            op.get_random_valid_move(side, rng)
+
+    def run_batch():
+        op.get_random_valid_moves(sides, rng)
+
+    return {
+        "random_valid_move": result(measure_rate(run_single, len(sides)), "moves/s"),
+        "random_valid_moves[batch]": result(
+            measure_rate(run_batch, len(sides)), "moves/s"
+        ),
+    }
+
+
+def bench_step() -> dict:
+    env = get_env()
+    env.reset(seed=0)
+    n_steps = 1_000
+
+    def run():
+        for _ in range(n_steps):
+            if play_random_step(env):
+                env.reset()
+
+    return result(measure_rate(run, n_steps), "steps/s")
+
+
+def bench_reset() -> dict:
+    env = get_env()
+    n_resets = 1_000
+
+    def run():
+        for _ in range(n_resets):
+            env.reset()
+
+    return result(measure_rate(run, n_resets), "resets/s")
+
+
+def bench_full_game() -> dict:
+    env = get_env()
+    env.reset(seed=0)
+    n_games = 50
+
+    def run():
+        for _ in range(n_games):
+            env.reset()
+            while not play_random_step(env):
+                pass
+
+    return result(measure_rate(run, n_games), "games/s")
+
+
+def bench_get_obs() -> dict:
+    env = get_env()
+    env.reset(seed=0)
+    n_calls = 10_000
+
+    def run():
+        for _ in range(n_calls):
+            env._get_obs()
+
+    return result(measure_rate(run, n_calls), "calls/s")
+
+
+def bench_step_result(positions: list[np.array]) -> dict:
+    """
+    The reads of the board a step makes to build its result, after the moves are applied
+    """
+    env = get_env()
+    env.reset(seed=0)
+    n_positions = 100
+    states = [
+        (obs[:6].tolist(), int(obs[6]), obs[7:13].tolist(), int(obs[13]))
+        for obs in positions[:n_positions]
+    ]
+
+    def run():
+        for state in states:
+            env._set_board_state(*state)
+            env._get_obs()
+            env._get_player_reward()
+            env._is_game_over()
+            env._get_info()
+
+    return result(measure_rate(run, n_positions), "steps/s")
+
+
+def bench_step_first_valid_opponent() -> dict:
+    """
+    Steps against an opponent that costs next to nothing, so the time is the env's own
+    """
+    env = gym.make(
+        "Mancala-v0",
+        max_episode_steps=100,
+        opponent_policy=lambda rng, obs: int(np.flatnonzero(obs[:6])[0]),
+    ).unwrapped
+    env.reset(seed=0)
+    n_steps = 1_000
+
+    def run():
+        for _ in range(n_steps):
+            if play_random_step(env):
+                env.reset()
+
+    return result(measure_rate(run, n_steps), "steps/s")
+
+
+def bench_saved_policy(model_name: str, positions: list[np.array]) -> dict:
+    """
+    Single observation forward passes of a saved model, as made by the opponent policy
+    """
+    # Imported here so the env benchmarks can run without a saved model or torch
+    from pkg.mancala_agent_pkg.model.load_model import get_model_path, load_model
+    from pkg.mancala_agent_pkg.model.quantized_policy import (
+        is_quantized_exported,
+        load_quantized_q_net_weights,
+        quantized_q_values,
+    )
+    from pkg.mancala_agent_pkg.model.numpy_policy import get_q_net_weights, q_values
+
+    model = load_model(model_name)
+    weights = get_q_net_weights(model)
+    observations = positions[:100]
+    batch = np.array(positions)
+
+    def run_torch():
+        for obs in observations:
+            model.predict(obs, deterministic=True)
+
+    def run_numpy():
+        for obs in observations:
+            q_values(weights, obs)
+
+    results = {
+        f"saved_policy[{model_name}].predict": result(
+            measure_rate(run_torch, len(observations)), "obs/s"
+        ),
+        f"saved_policy[{model_name}].numpy_forward": result(
+            measure_rate(run_numpy, len(observations)), "obs/s"
+        ),
+        f"saved_policy[{model_name}].numpy_forward[batch]": result(
+            measure_rate(lambda: q_values(weights, batch), len(batch)), "obs/s"
+        ),
+    }
+
+    model_dir = get_model_path(model_name)
+    if is_quantized_exported(model_dir):
+        quantized, _ = load_quantized_q_net_weights(model_dir)
+
+        def run_int8():
+            for obs in observations:
+                quantized_q_values(quantized, obs)
+
+        results[f"saved_policy[{model_name}].int8_forward"] = result(
+            measure_rate(run_int8, len(observations)), "obs/s"
+        )
+        results[f"saved_policy[{model_name}].int8_forward[batch]"] = result(
+            measure_rate(lambda: quantized_q_values(quantized, batch), len(batch)),
+            "obs/s",
+        )
+
+    return results
+
+
+def run_benchmarks(model_name: str) -> dict:
+    positions = sample_positions(N_POSITIONS)
+
+    results = {
+        "make_valid_action": bench_make_valid_action(positions),
+        "env.step[random_opponent]": bench_step(),
+        "env.step[first_valid_opponent]": bench_step_first_valid_opponent(),
+        "env.step_result": bench_step_result(positions),
+        "env.reset[random_opponent]": bench_reset(),
+        "full_game[random_vs_random]": bench_full_game(),
+        "env._get_obs": bench_get_obs(),
+        **bench_kernel(positions),
+        **bench_random_valid_moves(positions),
+    }
+
+    if os.path.isfile(f"./saved_models/{model_name}/best_model.zip"):
+        results.update(bench_saved_policy(model_name, positions))
+    else:
+        print(f"skipping saved policy benchmarks, no saved model named '{model_name}'")
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--history",
+        type=str,
+        default="./benchmark_results/env.json",
+        help="JSON file of previous results to compare against and append to",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Fractional slowdown versus the previous run that counts as a regression",
+    )
+    parser.add_argument(
+        "--model", type=str, default="prod", help="Saved model to benchmark"
+    )
+    parser.add_argument(
+        "--no-record",
+        action="store_true",
+        default=False,
+        help="Compare against the history without appending this run to it",
+    )
+    args = parser.parse_args()
+
+    regressions = record_and_compare(
+        args.history,
+        run_benchmarks(args.model),
+        args.threshold,
+        record=not args.no_record,
+    )
+
+    if regressions:
+        print("\nRegressions:")
+        print("\n".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import json
+import os
+import platform
+from datetime import datetime
+
+
+def result(value: float, unit: str, higher_is_better: bool = True) -> dict:
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def load_history(history_path: str) -> list[dict]:
+    if not os.path.isfile(history_path):
+        return []
+
+    with open(history_path) as f:
+        return json.load(f)
+
+
+def save_history(history_path: str, history: list[dict]):
+    directory = os.path.dirname(history_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # Write then rename, so an interrupted run can't corrupt the baseline
+    with open(f"{history_path}.tmp", "w") as f:
+        json.dump(history, f, indent=2)
+    os.replace(f"{history_path}.tmp", history_path)
+
+
+def find_regressions(previous: dict, current: dict, threshold: float) -> list[str]:
+    """
+    Returns: A message for each benchmark in both runs that got worse by more than `threshold`,
+    as a fraction of the previous value
+    """
+    regressions = []
+    for name, now in current.items():
+        before = previous.get(name)
+        if before is None or before["value"] == 0:
+            continue
+
+        change = (now["value"] - before["value"]) / before["value"]
+        if not now["higher_is_better"]:
+            change = -change
+
+        if change < -threshold:
+            regressions.append(
+                f"{name}: {before['value']:.4g} -> {now['value']:.4g} {now['unit']} "
+                f"({change:+.1%})"
+            )
+    return regressions
+
+
+def print_results(results: dict, previous: dict | None):
+    for name, now in results.items():
+        line = f"{name:<40} {now['value']:>14.4g} {now['unit']}"
+        if previous and name in previous and previous[name]["value"]:
+            change = (now["value"] - previous[name]["value"]) / previous[name]["value"]
+            line += f"  ({change:+.1%} vs previous)"
+        print(line)
+
+
+def record_and_compare(
+    history_path: str, results: dict, threshold: float, record: bool = True
+) -> list[str]:
+    """
+    Compare `results` against the last run in the history at `history_path`, then append them.
+
+    Returns: Messages describing any regressions beyond `threshold`
+    """
+    history = load_history(history_path)
+    previous = history[-1]["results"] if history else None
+
+    print_results(results, previous)
+    regressions = find_regressions(previous, results, threshold) if previous else []
+
+    if record:
+        history.append(
+            {
+                "timestamp": f"{datetime.now():%Y-%m-%d_%H-%M-%S}",
+                "python": platform.python_version(),
+                "machine": platform.node(),
+                "results": results,
+            }
+        )
+        save_history(history_path, history)
+
+    return regressions
@@ -0,0 +1,105 @@
+import argparse
+import subprocess
+import sys
+
+import numpy as np
+
+from pkg.mancala_agent_pkg.benchmark.history import record_and_compare, result
+
+SERVER_MODULE = "pkg.mancala_agent_pkg.inference_api.server"
+# Heavy dependencies that the serving path should only import if it really needs them
+WATCHED_MODULES = ["torch", "stable_baselines3", "gymnasium", "fastapi", "numpy"]
+
+
+def measure_import(module: str) -> dict[str, float]:
+    """
+    Import `module` in a fresh interpreter with `-X importtime`.
+
+    Returns: Cumulative import time in microseconds for the module and each watched module that
+    was imported along with it
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    # Lines are formatted as "import time: <self us> | <cumulative us> | <indented module name>"
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        if name == module or name in WATCHED_MODULES:
+            times[name] = int(cumulative)
+    return times
+
+
+def run_benchmarks(repeats: int) -> dict:
+    runs = [measure_import(SERVER_MODULE) for _ in range(repeats)]
+
+    results = {
+        f"import[{SERVER_MODULE}]": result(
+            np.median([run[SERVER_MODULE] for run in runs]) / 1000,
+            "ms",
+            higher_is_better=False,
+        )
+    }
+    for module in WATCHED_MODULES:
+        imported = [run[module] for run in runs if module in run]
+        # Recorded even when not imported, so a dependency sneaking back in shows up
+        results[f"import[{module}]"] = result(
+            np.median(imported) / 1000 if imported else 0.0,
+            "ms",
+            higher_is_better=False,
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=5,
+        help="Fresh interpreters to take the median of",
+    )
+    parser.add_argument(
+        "--history",
+        type=str,
+        default="./benchmark_results/import_time.json",
+        help="JSON file of previous results to compare against and append to",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Fractional slowdown versus the previous run that counts as a regression",
+    )
+    parser.add_argument(
+        "--no-record",
+        action="store_true",
+        default=False,
+        help="Compare against the history without appending this run to it",
+    )
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.repeats)
+    regressions = record_and_compare(
+        args.history, results, args.threshold, record=not args.no_record
+    )
+
+    for module in ["torch", "stable_baselines3"]:
+        if results[f"import[{module}]"]["value"] > 0:
+            regressions.append(f"{module} is imported when importing the server")
+
+    if regressions:
+        print("\nRegressions:")
+        print("\n".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import argparse
+import json
+import sys
+
+from mancala_env.envs import kernel
+from mancala_env.envs.perft import ENGINES, START_BOARD, PerftResult, perft
+from pkg.mancala_agent_pkg.benchmark.history import record_and_compare, result
+from pkg.mancala_agent_pkg.inference_api.game_records import board_state_to_array
+from pkg.mancala_agent_pkg.inference_api.types import BoardState
+
+
+def print_counts(results: dict[str, PerftResult]):
+    print(f"{'depth':>5} {'nodes':>16} {'terminal':>16} {'positions':>16}")
+    counts = next(iter(results.values()))
+    for depth, (nodes, terminal, positions) in enumerate(
+        zip(counts.nodes, counts.terminal, counts.positions)
+    ):
+        print(
+            f"{depth:>5} {nodes:>16} {terminal:>16} "
+            f"{'-' if positions is None else positions:>16}"
+        )
+
+
+def find_mismatches(results: dict[str, PerftResult]) -> list[str]:
+    """
+    Returns: The engines whose counts differ from the first engine's
+    """
+    (expected_engine, expected), *others = results.items()
+    return [
+        f"'{engine}' counted nodes {counts.nodes} and terminal {counts.terminal}, but "
+        f"'{expected_engine}' counted nodes {expected.nodes} and terminal {expected.terminal}"
+        for engine, counts in others
+        if (counts.nodes, counts.terminal) != (expected.nodes, expected.terminal)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depth", type=int, default=8)
+    parser.add_argument(
+        "--engines",
+        type=str,
+        nargs="+",
+        default=list(ENGINES),
+        choices=list(ENGINES),
+        help="Implementations of the rules to count with, which must all agree",
+    )
+    parser.add_argument(
+        "--state",
+        type=str,
+        default=None,
+        help="JSON board state to count from, as sent to the inference API. Defaults to "
+        "the start of a game",
+    )
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--no-transpositions",
+        action="store_true",
+        default=False,
+        help="Expand every sequence of moves, rather than each distinct position once",
+    )
+    parser.add_argument(
+        "--max-frontier",
+        type=int,
+        default=1 << 20,
+        help="Positions held at once before the search is split into chunks, which bounds "
+        "memory use",
+    )
+    parser.add_argument(
+        "--history",
+        type=str,
+        default="./benchmark_results/perft.json",
+        help="JSON file of previous results to compare against and append to",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Fractional slowdown versus the previous run that counts as a regression",
+    )
+    parser.add_argument(
+        "--no-record",
+        action="store_true",
+        default=False,
+        help="Compare against the history without appending this run to it",
+    )
+    args = parser.parse_args()
+
+    board = START_BOARD
+    if args.state is not None:
+        state = BoardState(**json.loads(args.state))
+        board = board_state_to_array(state)
+        # Counted from the perspective of the side to move
+        if state.opponent_to_start:
+            board = kernel.flip(board)
+
+    results, timings = {}, {}
+    for engine in args.engines:
+        # Compile the kernel before timing
+        perft(board, depth=2, engine=engine)
+        counts = perft(
+            board,
+            args.depth,
+            engine,
+            transpositions=not args.no_transpositions,
+            n_workers=args.workers,
+            max_frontier=args.max_frontier,
+        )
+        results[engine] = counts
+
+        name = f"perft[{engine}].depth_{args.depth}"
+        if args.no_transpositions:
+            name = f"{name}.no_transpositions"
+        timings[f"{name}.nodes"] = result(counts.nodes[-1] / counts.elapsed, "nodes/s")
+        timings[f"{name}.moves"] = result(
+            counts.moves_applied / counts.elapsed, "moves/s"
+        )
+
+    print_counts(results)
+    print()
+
+    mismatches = find_mismatches(results)
+    regressions = record_and_compare(
+        args.history,
+        timings,
+        args.threshold,
+        record=not args.no_record and not mismatches,
+    )
+
+    if mismatches:
+        print("\nEngines disagree:")
+        print("\n".join(mismatches))
+        sys.exit(1)
+
+    if regressions:
+        print("\nRegressions:")
+        print("\n".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import time
+from typing import Callable
+
+
+def measure_rate(
+    fn: Callable[[], None],
+    ops_per_call: int = 1,
+    min_time: float = 0.2,
+    repeats: int = 5,
+) -> float:
+    """
+    Time repeated calls of `fn`, each call performing `ops_per_call` operations.
+
+    Returns: The best operations per second out of `repeats` runs, each lasting at least `min_time`
+    """
+    # Calibrate the number of calls so each run is long enough to swamp timer overhead
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        calls *= 2
+
+    best = elapsed
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        best = min(best, time.perf_counter() - start)
+
+    return calls * ops_per_call / best
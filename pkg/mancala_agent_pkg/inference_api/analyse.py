@@ -0,0 +1,108 @@
+import numpy as np
+
+from pkg.mancala_agent_pkg.inference_api.game_records import board_state_to_array
+from pkg.mancala_agent_pkg.inference_api.types import BoardState
+from pkg.mancala_agent_pkg.model.infer import PROD_MODEL_NAME, get_served_q_values
+from pkg.mancala_agent_pkg.model.numpy_policy import best_valid_actions
+
+
+def board_array_to_state(board: list[int], opponent_to_start: bool) -> dict:
+    return {
+        "player_side": board[:6],
+        "player_score": board[6],
+        "opponent_side": board[7:13],
+        "opponent_score": board[13],
+        "opponent_to_start": opponent_to_start,
+    }
+
+
+def analyse_positions(
+    board_states: list[BoardState], model_name: str = PROD_MODEL_NAME
+) -> list[dict]:
+    """
+    Evaluates every move of each position for whoever is to move in it, with one forward pass
+    of the model for all the positions and one batch of moves for all their legal moves. The
+    model's weights are the ones its moves are served from, int8 or float.
+
+    Returns: For each position, whether the game is over, the model's best legal move, and for
+    each action its Q-value, legality and (if legal) the resulting position, in the same
+    orientation as the request
+    """
+    # Imported here so that importing the server doesn't wait on importing Numba
+    from mancala_env.envs import kernel
+
+    boards = np.array([board_state_to_array(state) for state in board_states])
+    opponent_to_move = np.array([state.opponent_to_start for state in board_states])
+
+    # The model and kernel both see boards from the perspective of the side to move
+    mover_boards = np.where(opponent_to_move[:, None], kernel.flip(boards), boards)
+    is_game_over = kernel.is_terminal_batch(mover_boards)
+    is_legal = kernel.legal_moves_batch(mover_boards) & ~is_game_over[:, None]
+    values = get_served_q_values(model_name, mover_boards)
+    best_moves = best_valid_actions(values, mover_boards)
+
+    position_indices, actions = np.nonzero(is_legal)
+    next_boards = mover_boards[position_indices]
+    plays_again = kernel.apply_moves(next_boards, actions)
+    next_boards = np.where(
+        opponent_to_move[position_indices, None], kernel.flip(next_boards), next_boards
+    )
+    # The turn only passes over if the side that moved doesn't play again
+    next_opponent_to_move = opponent_to_move[position_indices] ^ ~plays_again
+
+    move_indices = np.full(is_legal.shape, -1)
+    move_indices[position_indices, actions] = np.arange(len(actions))
+    next_boards = next_boards.tolist()
+
+    analyses = []
+    for i in range(len(board_states)):
+        moves = []
+        for action, move_index in enumerate(move_indices[i].tolist()):
+            is_move_legal = move_index >= 0
+            moves.append(
+                {
+                    "action": action,
+                    "is_legal": is_move_legal,
+                    "q_value": None if is_game_over[i] else float(values[i, action]),
+                    "plays_again": (
+                        bool(plays_again[move_index]) if is_move_legal else None
+                    ),
+                    "next_state": (
+                        board_array_to_state(
+                            next_boards[move_index],
+                            bool(next_opponent_to_move[move_index]),
+                        )
+                        if is_move_legal
+                        else None
+                    ),
+                }
+            )
+
+        analyses.append(
+            {
+                "is_game_over": bool(is_game_over[i]),
+                "best_move": None if is_game_over[i] else int(best_moves[i]),
+                "moves": moves,
+            }
+        )
+
+    return analyses
+
+
+def warm_up_analysis(model_name: str = PROD_MODEL_NAME):
+    """
+    Load the model's weights and compile the rules kernel (if Numba is installed), so that the
+    first analysis request doesn't pay for either
+    """
+    analyse_positions(
+        [
+            BoardState(
+                player_side=[4] * 6,
+                player_score=0,
+                opponent_side=[4] * 6,
+                opponent_score=0,
+                opponent_to_start=False,
+            )
+        ],
+        model_name,
+    )
@@ -0,0 +1,67 @@
+import asyncio
+import time
+from typing import Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one computation, run on the event loop's
+    default executor, which every caller awaits.
+
+    A computation is only joined for `timeout_seconds` after it started, and callers stop
+    waiting for it then. So a slow or stuck computation for one key times out its own callers,
+    and the next call for the key starts afresh, without affecting any other key. Only
+    computations in flight are shared, nothing is cached once they finish.
+
+    Not thread safe, it's only used from the event loop.
+    """
+
+    def __init__(self, timeout_seconds: float = 5.0):
+        self._timeout_seconds = timeout_seconds
+        # key -> (computation, time it started)
+        self._in_flight: dict[Hashable, tuple[asyncio.Future, float]] = {}
+        self.metrics = {
+            "calls": 0,
+            "computed": 0,
+            "coalesced": 0,
+            "timeouts": 0,
+        }
+
+    def _start(self, key: Hashable, compute: Callable, *args) -> asyncio.Future:
+        future = asyncio.get_running_loop().run_in_executor(None, compute, *args)
+        self._in_flight[key] = (future, time.monotonic())
+        self.metrics["computed"] += 1
+
+        def forget(_):
+            # Unless a later call has already replaced this computation
+            if self._in_flight.get(key, (None,))[0] is future:
+                del self._in_flight[key]
+
+        future.add_done_callback(forget)
+        return future
+
+    async def do(self, key: Hashable, compute: Callable, *args):
+        """
+        Returns: The result of `compute(*args)`, from the computation already in flight for
+        `key` if there is one. Raises whatever the computation raises, or TimeoutError if it
+        doesn't finish within the timeout.
+        """
+        self.metrics["calls"] += 1
+        now = time.monotonic()
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None and now - in_flight[1] < self._timeout_seconds:
+            future, started_at = in_flight
+            self.metrics["coalesced"] += 1
+        else:
+            future, started_at = self._start(key, compute, *args), now
+
+        try:
+            # Shielded, so one caller timing out or disconnecting doesn't cancel the others
+            return await asyncio.wait_for(
+                asyncio.shield(future),
+                timeout=started_at + self._timeout_seconds - now,
+            )
+        except asyncio.TimeoutError:
+            self.metrics["timeouts"] += 1
+            raise
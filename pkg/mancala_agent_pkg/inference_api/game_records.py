@@ -0,0 +1,65 @@
+import atexit
+import os
+from functools import lru_cache
+
+import numpy as np
+from mancala_env.envs.game_record import GameRecordWriter
+
+from pkg.mancala_agent_pkg.inference_api.types import BoardState, History
+
+# Games played through the API are only recorded if this is set
+GAME_RECORD_PATH = os.environ.get("MANCALA_GAME_RECORD_PATH")
+
+
+@lru_cache(maxsize=1)
+def get_game_record_writer() -> GameRecordWriter | None:
+    if GAME_RECORD_PATH is None:
+        return None
+
+    writer = GameRecordWriter(GAME_RECORD_PATH)
+    atexit.register(writer.close)
+    return writer
+
+
+def close_game_record_writer():
+    """
+    Writes out any buffered games. Called on shutdown, since forked workers exit without
+    running atexit handlers.
+    """
+    if get_game_record_writer.cache_info().currsize == 0:
+        return
+
+    writer = get_game_record_writer()
+    if writer is not None:
+        atexit.unregister(writer.close)
+        writer.close()
+    get_game_record_writer.cache_clear()
+
+
+def board_state_to_array(board_state: BoardState) -> np.array:
+    return np.array(
+        board_state.player_side
+        + [board_state.player_score]
+        + board_state.opponent_side
+        + [board_state.opponent_score]
+    )
+
+
+def record_history(history: History):
+    """
+    Record the moves played in a single request. These are usually only part of a game, so
+    unless the game finished they are marked as unfinished.
+    """
+    writer = get_game_record_writer()
+    if writer is None or not history.entries:
+        return
+
+    played = history.entries[:-1]
+    writer.write_game(
+        states=np.array(
+            [board_state_to_array(entry.state) for entry in history.entries]
+        ),
+        actions=np.array([entry.post_action for entry in played]),
+        opponent_moves=np.array([entry.state.opponent_to_start for entry in played]),
+        opponent_to_move=history.entries[-1].state.opponent_to_start,
+    )
@@ -1,7 +1,7 @@
 import gymnasium as gym
 import mancala_env
 
-from pkg.mancala_agent_pkg.inference_api.types import BoardState
+from pkg.mancala_agent_pkg.inference_api.types import BoardState, History
 from dataclasses import dataclass
 from pkg.mancala_agent_pkg.model.infer import infer_from_observation
 
@@ -58,3 +58,39 @@ def get_action_to_play_from(board_state: BoardState) -> ActionPlayed:
         action=infer_from_observation(env._get_obs()),
         was_opponent_move=board_state.opponent_to_start,
     )
+
+
+@dataclass
+class MoveWithReplies:
+    state: dict
+    allowed_moves: list[int]
+    history: History
+
+
+def play_move_with_replies(board_state: BoardState, action: int) -> MoveWithReplies:
+    """
+    Play the player's `action`, then the model's replies until it's the player's turn again or
+    the game is over
+    """
+    history = History()
+    history.record_start(state=board_state, action=action)
+
+    env = get_env_from(board_state)
+    env.step_in_play_mode(action)
+    latest_state = BoardState(**env.get_serialised_form())
+
+    while (
+        latest_state.opponent_to_start and not env.get_serialised_form()["is_game_over"]
+    ):
+        opponent_action = get_action_to_play_from(latest_state)
+        history.record(latest_state, opponent_action.action)
+
+        env.step_in_play_mode(opponent_action.action)
+        latest_state = BoardState(**env.get_serialised_form())
+
+    history.end(latest_state)
+    return MoveWithReplies(
+        state=env.get_serialised_form(),
+        allowed_moves=env.get_allowed_moves(),
+        history=history,
+    )
@@ -0,0 +1,107 @@
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+
+import uvicorn
+
+from pkg.mancala_agent_pkg.inference_api.analyse import warm_up_analysis
+from pkg.mancala_agent_pkg.inference_api.server import app
+from pkg.mancala_agent_pkg.model.infer import PROD_MODEL_NAME, warm_up
+from pkg.mancala_agent_pkg.model.load_model import get_model_path
+from pkg.mancala_agent_pkg.model.numpy_policy import is_exported
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+stream_handler = logging.StreamHandler(sys.stdout)
+stream_handler.setFormatter(
+    logging.Formatter(
+        "%(asctime)s [%(process)d] [%(levelname)s] [%(name)s]: %(message)s"
+    )
+)
+logger.addHandler(stream_handler)
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, log_level: str):
+    # The parent's signal handlers would otherwise be inherited
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    uvicorn.Server(uvicorn.Config(app, log_level=log_level)).run(sockets=[sock])
+
+
+def fork_worker(sock: socket.socket, log_level: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        exit_code = 0
+        try:
+            run_worker(sock, log_level)
+        except Exception:
+            logger.exception("worker failed")
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of forked server processes",
+    )
+    parser.add_argument("--host", type=str, default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--log-level", type=str, default="info")
+    args = parser.parse_args()
+
+    if not is_exported(get_model_path(PROD_MODEL_NAME)):
+        logger.warning(
+            "prod model has no exported weights, so every worker will hold its own copy"
+        )
+
+    # Import the app and load the model before forking, so every worker inherits the same
+    # read-only mapping of the weights rather than loading its own copy
+    warm_up()
+    warm_up_analysis()
+    sock = bind_socket(args.host, args.port)
+
+    workers = {fork_worker(sock, args.log_level) for _ in range(args.workers)}
+    logger.info(f"started '{len(workers)}' workers on {args.host}:{args.port}")
+
+    is_shutting_down = False
+
+    def shut_down(signum, _):
+        nonlocal is_shutting_down
+        is_shutting_down = True
+        for pid in workers:
+            os.kill(pid, signum)
+
+    signal.signal(signal.SIGINT, shut_down)
+    signal.signal(signal.SIGTERM, shut_down)
+
+    while workers:
+        pid, status = os.wait()
+        workers.discard(pid)
+        if not is_shutting_down:
+            logger.warning(
+                f"worker '{pid}' exited with status '{status}', restarting it"
+            )
+            workers.add(fork_worker(sock, args.log_level))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,19 @@
 import os
 import sys
+import time
+import asyncio
 import logging
+import logging.handlers
+import threading
+from contextlib import asynccontextmanager
 from dataclasses import asdict
+from datetime import datetime
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
 from fastapi.openapi.utils import get_openapi
 from fastapi.routing import APIRoute
+from starlette.background import BackgroundTask
 
 from pydantic import BaseModel, NonNegativeInt, Field, ConfigDict
 
@@ -14,19 +21,110 @@ from pkg.mancala_agent_pkg.inference_api.infer import (
     get_action_to_play_from,
     get_fresh_env,
     get_env_from,
+    play_move_with_replies,
 )
 from pkg.mancala_agent_pkg.inference_api.types import (
     BoardState,
     PlayMetadata,
     History,
+    PositionAnalysis,
+)
+from pkg.mancala_agent_pkg.inference_api.analyse import (
+    analyse_positions,
+    warm_up_analysis,
+)
+from pkg.mancala_agent_pkg.inference_api.game_records import (
+    close_game_record_writer,
+    record_history,
+)
+from pkg.mancala_agent_pkg.inference_api.coalescing import SingleFlight
+from pkg.mancala_agent_pkg.inference_api.speculation import (
+    ReplyPrecomputer,
+    pack_board_state,
+)
+from pkg.mancala_agent_pkg.model.infer import (
+    PROD_MODEL_NAME,
+    get_model_version,
+    is_model_outdated,
+    warm_up,
 )
 
-from mancala_env import get_game_information_message_format
+from mancala_env.envs import env_logging
+from pkg.mancala_agent_pkg.profiling import profile_to
 
 REDIRECT_PREFIX = "/mancala"
 open_api_schema_path = "api/v1/openapi.json"
 
+# Profiling individual requests is opt-in per deployment, since profiles are written to disk
+PROFILING_ENABLED = os.environ.get("MANCALA_PROFILING_ENABLED", "0") == "1"
+PROFILES_PATH = os.environ.get("MANCALA_PROFILES_PATH", "./last_profiles")
+# Only one profiler can be active in a process at a time
+profile_lock = asyncio.Lock()
+
+# Bounds the work done by a single analysis request
+MAX_ANALYSE_POSITIONS = 256
+
+# Precomputing the result of each of the player's moves while they choose is opt-in, since it
+# uses spare CPU on moves that mostly won't be played
+SPECULATION_ENABLED = os.environ.get("MANCALA_SPECULATION_ENABLED", "0") == "1"
+precomputer = (
+    ReplyPrecomputer(
+        play_move_with_replies,
+        max_entries=int(os.environ.get("MANCALA_SPECULATION_CACHE_SIZE", 1024)),
+    )
+    if SPECULATION_ENABLED
+    else None
+)
+
+# Concurrent next_move requests for the same position share one inference, which callers stop
+# waiting for after this long
+next_move_flights = SingleFlight(
+    timeout_seconds=float(os.environ.get("MANCALA_NEXT_MOVE_TIMEOUT_SECONDS", 5))
+)
+
+model_ready = threading.Event()
+
+
+def warm_up_model():
+    start = time.perf_counter()
+    try:
+        warm_up()
+        warm_up_analysis()
+    except Exception:
+        uvicorn_logger.exception(
+            "failed to warm up model, server will not report ready"
+        )
+        return
+
+    model_ready.set()
+    uvicorn_logger.info(f"model warmed up in {time.perf_counter() - start:.2f}s")
+
+
+def start_logging() -> logging.handlers.QueueListener:
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(env_logging.JsonLinesFormatter())
+    return env_logging.start_queue_logging(
+        stream_handler,
+        level=logging.INFO,
+        sample_rate=float(os.environ.get("MANCALA_LOG_SAMPLE_RATE", 1.0)),
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Started here rather than on import, since prefork imports the app before forking and the
+    # listener's thread wouldn't survive into the workers
+    log_listener = start_logging()
+    # Warm up off the event loop so that the server can answer liveness checks in the meantime
+    warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up_model))
+    yield
+    await warm_up_task
+    close_game_record_writer()
+    env_logging.stop_queue_logging(log_listener)
+
+
 app = FastAPI(
+    lifespan=lifespan,
     title="Mancala API",
     description="API for playing the game of Mancala",
     version="1.0.0",
@@ -37,18 +135,6 @@ app = FastAPI(
 
 uvicorn_logger = logging.getLogger("uvicorn.error")
 
-mancala_env_logger = logging.getLogger("mancala_env.envs.env_logging")
-mancala_env_logger.setLevel(logging.INFO)
-formatter = logging.Formatter(
-    "%(asctime)s [%(processName)s: %(process)d] "
-    "[%(threadName)s: %(thread)d] [%(levelname)s] "
-    f"[%(name)s] [{get_game_information_message_format()}]: "
-    "%(message)s"
-)
-stream_handler = logging.StreamHandler(sys.stdout)
-stream_handler.setFormatter(formatter)
-mancala_env_logger.addHandler(stream_handler)
-
 headers = {
     "Cache-Control": "no-cache, no-store, must-revalidate, max-age=0",
     "Pragme": "no-cache",
@@ -113,10 +199,61 @@ async def dispatch(request: Request, call_next):
     uvicorn_logger.info(f"path: {request.scope['path']}")
     uvicorn_logger.debug(f"open_api_url: {request.app.openapi_url}")
 
+    if PROFILING_ENABLED and is_profile_requested(request):
+        return await call_next_with_profile(request, call_next)
+
     response = await call_next(request)
     return response
 
 
+def is_profile_requested(request: Request) -> bool:
+    return (
+        request.headers.get("X-Profile") == "1"
+        or request.query_params.get("profile") == "true"
+    )
+
+
+async def call_next_with_profile(request: Request, call_next):
+    """
+    Profiles a single request, storing the profile under PROFILES_PATH and returning its name
+    in the `X-Profile-Name` header. The handler runs on the event loop thread, so anything else
+    the loop does while the request is in flight is captured too. Requests to profile while
+    another is being profiled are rejected with a 409, rather than profiling both at once.
+    """
+    if profile_lock.locked():
+        return JSONResponse(
+            status_code=409,
+            content={"detail": "another request is being profiled, try again"},
+            headers=headers,
+        )
+
+    os.makedirs(PROFILES_PATH, exist_ok=True)
+    route = request.scope["path"].strip("/").replace("/", "_")
+    profile_name = f"{datetime.now():%Y-%m-%d_%H-%M-%S-%f}_{route}"
+
+    async with profile_lock:
+        with profile_to(os.path.join(PROFILES_PATH, profile_name)):
+            response = await call_next(request)
+
+    uvicorn_logger.info(f"stored profile: '{profile_name}'")
+    response.headers["X-Profile-Name"] = profile_name
+    return response
+
+
+def speculate_replies(state: dict, allowed_moves: list[int]) -> BackgroundTask | None:
+    """
+    Returns: A task to run once the response is sent, which starts precomputing the result of
+    each of the player's moves, if it's their turn next
+    """
+    if precomputer is None or state["opponent_to_start"] or state["is_game_over"]:
+        return None
+
+    async def schedule():
+        precomputer.schedule(BoardState(**state), allowed_moves)
+
+    return BackgroundTask(schedule)
+
+
 class BoardStateResponse(BaseModel):
     model_config = ConfigDict(strict=True)
     current_state: BoardState
@@ -140,19 +277,55 @@ class ActionRequest(BaseModel):
     current_state: BoardState = Field(alias="current-state")
 
 
+class AnalyseRequest(BaseModel):
+    model_config = ConfigDict(strict=True)
+    states: list[BoardState] = Field(min_length=1, max_length=MAX_ANALYSE_POSITIONS)
+
+
+class AnalyseResponse(BaseModel):
+    model_config = ConfigDict(strict=True)
+    analyses: list[PositionAnalysis]
+    # As in /api/ready, including whether the int8 or float weights were used
+    model_version: str
+
+
+@app.get("/api/ready", tags=["service"])
+async def get_ready() -> JSONResponse:
+    """
+    Readiness check, which only succeeds once the model has been loaded and warmed up. Once
+    ready, also reports which model is served, and whether its tag has since been moved to
+    another model, which a restart would pick up.
+    """
+    if not model_ready.is_set():
+        return JSONResponse(status_code=503, content={"ready": False}, headers=headers)
+
+    return JSONResponse(
+        status_code=200,
+        content={
+            "ready": True,
+            "model_version": get_model_version(PROD_MODEL_NAME),
+            "model_outdated": is_model_outdated(PROD_MODEL_NAME),
+        },
+        headers=headers,
+    )
+
+
 @app.get("/api/initial_state", tags=["atomic-action"])
 async def get_initial_state(is_agent_turn: bool) -> BoardStateResponse:
     """
     Get the initial state of a new game.
     """
     env = get_fresh_env(is_player_turn=is_agent_turn)
+    state = env.get_serialised_form()
+    allowed_moves = env.get_allowed_moves()
 
     return JSONResponse(
         content=BoardStateResponse(
-            current_state=env.get_serialised_form(),
-            metadata={"allowed_moves": env.get_allowed_moves()},
+            current_state=state,
+            metadata={"allowed_moves": allowed_moves},
         ).model_dump(),
         headers=headers,
+        background=speculate_replies(state, allowed_moves),
     )
 
 
@@ -171,13 +344,16 @@ async def get_next_env_state(body: ActionNextStateRequest) -> BoardStateResponse
 
     final_state = env.get_serialised_form()
     history.end(last_state=BoardState(**final_state))
+    record_history(history)
+    allowed_moves = env.get_allowed_moves()
 
     return JSONResponse(
         content=BoardStateResponse(
             current_state=final_state,
-            metadata={"allowed_moves": env.get_allowed_moves(), "history": history},
+            metadata={"allowed_moves": allowed_moves, "history": history},
         ).model_dump(),
         headers=headers,
+        background=speculate_replies(final_state, allowed_moves),
     )
 
 
@@ -187,8 +363,13 @@ async def get_next_move(body: ActionRequest) -> ActionResponse:
     Given an existing game state, return an action to play using the current deployed RL
     model. (Skill not currently guaranteed!)
     """
+    key = (get_model_version(PROD_MODEL_NAME), pack_board_state(body.current_state))
     try:
-        action = get_action_to_play_from(body.current_state)
+        action = await next_move_flights.do(
+            key, get_action_to_play_from, body.current_state
+        )
+    except TimeoutError:
+        raise HTTPException(status_code=504, detail="timed out getting action to play")
     except ValueError as e:
         raise HTTPException(
             status_code=400, detail=f"could not get action to play: {e}"
@@ -216,30 +397,13 @@ async def play_move(body: ActionNextStateRequest) -> BoardStateResponse:
     if body.current_state.opponent_to_start:
         raise HTTPException(status_code=400, detail="must be player's turn to play")
 
-    history = History()
-    history.record_start(state=body.current_state, action=body.action)
-
-    env = get_env_from(body.current_state)
-    env.step_in_play_mode(body.action)
-
-    latest_state = BoardState(**env.get_serialised_form())
-
-    if not latest_state.opponent_to_start:
-        history.end(latest_state)
-        return JSONResponse(
-            content=BoardStateResponse(
-                current_state=latest_state,
-                metadata={
-                    "allowed_moves": env.get_allowed_moves(),
-                    "history": history,
-                },
-            ).model_dump(),
-            headers=headers,
-        )
+    played = None
+    if precomputer is not None:
+        played = await precomputer.take(body.current_state, body.action)
 
-    while latest_state.opponent_to_start:
+    if played is None:
         try:
-            opponent_action = get_action_to_play_from(latest_state)
+            played = play_move_with_replies(body.current_state, body.action)
         except ValueError as e:
             raise HTTPException(
                 status_code=400, detail=f"could not get action to play: {e}"
@@ -249,22 +413,53 @@ async def play_move(body: ActionNextStateRequest) -> BoardStateResponse:
                 status_code=500, detail=f"could not get action to play: {e}"
             )
 
-        history.record(latest_state, opponent_action.action)
-
-        env.step_in_play_mode(opponent_action.action)
-        latest_state = BoardState(**env.get_serialised_form())
-
-    history.end(latest_state)
+    record_history(played.history)
 
     return JSONResponse(
         content=BoardStateResponse(
-            current_state=env.get_serialised_form(),
+            current_state=played.state,
             metadata={
-                "allowed_moves": env.get_allowed_moves(),
-                "history": history,
+                "allowed_moves": played.allowed_moves,
+                "history": played.history,
             },
         ).model_dump(),
         headers=headers,
+        background=speculate_replies(played.state, played.allowed_moves),
+    )
+
+
+@app.get("/api/metrics", tags=["service"])
+async def get_metrics() -> JSONResponse:
+    """
+    Counters for the server's optional optimisations, since it started.
+    """
+    return JSONResponse(
+        content={
+            "speculation": precomputer.metrics if precomputer is not None else None,
+            "next_move_coalescing": next_move_flights.metrics,
+        },
+        headers=headers,
+    )
+
+
+@app.post("/api/analyse", tags=["analysis"])
+async def analyse(body: AnalyseRequest) -> AnalyseResponse:
+    """
+    Given one or many game states, return the deployed RL model's Q-value for each move from
+    the perspective of whoever is to move, along with whether each move is legal and the game
+    state it leads to. Analyses are returned in the same order as the states, by the same
+    weights that /api/next_move plays from.
+    """
+    try:
+        analyses = analyse_positions(body.states)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"could not analyse states: {e}")
+
+    return JSONResponse(
+        content=AnalyseResponse(
+            analyses=analyses, model_version=get_model_version(PROD_MODEL_NAME)
+        ).model_dump(),
+        headers=headers,
     )
 
 
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+import numpy as np
+
+from pkg.mancala_agent_pkg.inference_api.types import BoardState
+
+logger = logging.getLogger(__name__)
+
+
+def pack_board_state(board_state: BoardState) -> bytes:
+    """
+    Returns: A compact key for a board state, including whose turn it is
+    """
+    return np.array(
+        board_state.player_side
+        + [board_state.player_score]
+        + board_state.opponent_side
+        + [board_state.opponent_score, board_state.opponent_to_start],
+        dtype=np.uint8,
+    ).tobytes()
+
+
+class ReplyPrecomputer:
+    """
+    Speculatively computes the result of each of the player's legal moves from a position on a
+    background thread, while the player is still choosing, so that the move they do play is
+    usually already computed.
+
+    Finished results are kept in a bounded LRU cache and expire after `ttl_seconds`, e.g. if the
+    game was abandoned. Only the `max_pending_positions` most recently scheduled positions have
+    jobs queued, older ones are cancelled. Once one move from a position is asked for, the jobs
+    and results for its other moves are dropped.
+    """
+
+    def __init__(
+        self,
+        compute: Callable[[BoardState, int], object],
+        max_entries: int = 1024,
+        ttl_seconds: float = 120.0,
+        max_pending_positions: int = 64,
+        max_workers: int = 1,
+    ):
+        self._compute = compute
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._max_pending_positions = max_pending_positions
+        # Few workers, so that speculation only uses spare capacity
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="speculation"
+        )
+
+        self._lock = threading.Lock()
+        # (packed state, action) -> (expiry time, result)
+        self._results: OrderedDict[tuple[bytes, int], tuple[float, object]] = (
+            OrderedDict()
+        )
+        # packed state -> {action: job}
+        self._pending: OrderedDict[bytes, dict[int, Future]] = OrderedDict()
+        self.metrics = {
+            "scheduled": 0,
+            "computed": 0,
+            "failed": 0,
+            "hits": 0,
+            "joined": 0,
+            "misses": 0,
+            "cancelled": 0,
+            "expired": 0,
+        }
+
+    def _run(self, key: bytes, board_state: BoardState, action: int):
+        try:
+            result = self._compute(board_state, action)
+        except Exception:
+            # The request for the move will compute it again and report the error itself
+            logger.exception("speculative move failed")
+            with self._lock:
+                self.metrics["failed"] += 1
+            raise
+
+        with self._lock:
+            self.metrics["computed"] += 1
+            # Only keep results that are still wanted, i.e. weren't cancelled meanwhile
+            if action in self._pending.get(key, {}):
+                self._results[(key, action)] = (
+                    time.monotonic() + self._ttl_seconds,
+                    result,
+                )
+                while len(self._results) > self._max_entries:
+                    self._results.popitem(last=False)
+        return result
+
+    def _cancel_position(self, key: bytes, keep_action: int | None = None):
+        jobs = self._pending.pop(key, {})
+        for action, job in jobs.items():
+            if action != keep_action and job.cancel():
+                self.metrics["cancelled"] += 1
+            if action != keep_action:
+                self._results.pop((key, action), None)
+
+    def schedule(self, board_state: BoardState, actions: list[int]):
+        key = pack_board_state(board_state)
+        with self._lock:
+            if key in self._pending:
+                self._pending.move_to_end(key)
+                return
+
+            jobs = {
+                action: self._executor.submit(self._run, key, board_state, action)
+                for action in actions
+                if (key, action) not in self._results
+            }
+            self._pending[key] = jobs
+            self.metrics["scheduled"] += len(jobs)
+
+            while len(self._pending) > self._max_pending_positions:
+                self._cancel_position(next(iter(self._pending)))
+
+    async def take(self, board_state: BoardState, action: int) -> object | None:
+        """
+        Returns: The precomputed result of playing `action` from `board_state`, waiting for it
+        if it's being computed right now, or None if it has to be computed by the caller
+        """
+        key = pack_board_state(board_state)
+        with self._lock:
+            job = self._pending.get(key, {}).get(action)
+            self._cancel_position(key, keep_action=action)
+
+            entry = self._results.pop((key, action), None)
+            if entry is not None:
+                expires_at, result = entry
+                if time.monotonic() < expires_at:
+                    self.metrics["hits"] += 1
+                    return result
+                self.metrics["expired"] += 1
+                return None
+
+            if job is None or job.cancel():
+                self.metrics["misses"] += 1
+                return None
+            self.metrics["joined"] += 1
+
+        try:
+            return await asyncio.wrap_future(job)
+        except Exception:
+            return None
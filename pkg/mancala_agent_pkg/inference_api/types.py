@@ -83,3 +83,20 @@ class PlayMetadata(BaseModel):
     model_config = ConfigDict(strict=True)
     allowed_moves: list[NonNegativeInt]
     history: Optional[History] = None
+
+
+class MoveEvaluation(BaseModel):
+    model_config = ConfigDict(strict=True)
+    action: NonNegativeInt
+    is_legal: bool
+    # From the perspective of the side to move, None if the game is over
+    q_value: Optional[float] = None
+    plays_again: Optional[bool] = None
+    next_state: Optional[BoardState] = None
+
+
+class PositionAnalysis(BaseModel):
+    model_config = ConfigDict(strict=True)
+    is_game_over: bool
+    best_move: Optional[NonNegativeInt] = None
+    moves: list[MoveEvaluation]
@@ -0,0 +1,313 @@
+"""
+A content-addressed store of saved models under ./saved_models/.store:
+
+* blobs/<sha256> holds each distinct file once, read-only
+* artifacts/<hash>/ holds a model's files as hardlinks to the blobs, and a manifest.json of
+  their hashes and which exports (NumPy, int8) the model has. Its hash is the manifest's, so
+  identical models are stored once
+* tags, e.g. ./saved_models/prod, are relative symlinks to an artifact, so anything reading a
+  model by its path keeps working, and moving a tag is one atomic rename
+
+Artifacts are built in a scratch directory and renamed into place, so readers never see one
+half written.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from pkg.mancala_agent_pkg.model.load_model import SAVED_MODELS_PATH
+from pkg.mancala_agent_pkg.model.numpy_policy import Q_NET_EXPORT_NAME
+from pkg.mancala_agent_pkg.model.quantized_policy import QUANTIZED_EXPORT_NAME
+
+STORE_NAME = ".store"
+MANIFEST_NAME = "manifest.json"
+
+EXPORTS = {"numpy": Q_NET_EXPORT_NAME, "int8": QUANTIZED_EXPORT_NAME}
+
+
+def get_store_path(root: str = SAVED_MODELS_PATH) -> str:
+    return os.path.join(root, STORE_NAME)
+
+
+def get_artifact_path(artifact: str, root: str = SAVED_MODELS_PATH) -> str:
+    return os.path.join(get_store_path(root), "artifacts", artifact)
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _make_scratch_dir(root: str) -> str:
+    scratch_root = os.path.join(get_store_path(root), "tmp")
+    os.makedirs(scratch_root, exist_ok=True)
+    return tempfile.mkdtemp(dir=scratch_root)
+
+
+def _get_blob_path(digest: str, root: str) -> str:
+    return os.path.join(get_store_path(root), "blobs", digest)
+
+
+def _check_blob(digest: str, root: str):
+    """
+    Blobs are shared by every artifact with the same file, so one written to in place, e.g.
+    through a tag, corrupts all of them. Anything built on one would be too.
+    """
+    assert (
+        hash_file(_get_blob_path(digest, root)) == digest
+    ), f"blob '{digest}' no longer matches its hash, the artifacts linking to it are corrupt"
+
+
+def _add_blob(path: str, root: str) -> str:
+    """
+    Returns: The hash of the file at `path`, after copying it into the store if it's new
+    """
+    digest = hash_file(path)
+    blob_path = _get_blob_path(digest, root)
+    if os.path.isfile(blob_path):
+        _check_blob(digest, root)
+        return digest
+
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    # Copied rather than linked, since the source may be written to again in place
+    scratch_path = f"{blob_path}.{os.getpid()}.tmp"
+    shutil.copyfile(path, scratch_path)
+    os.chmod(scratch_path, 0o444)
+    os.replace(scratch_path, blob_path)
+    return digest
+
+
+def get_manifest(files: dict[str, dict]) -> dict:
+    return {
+        "files": files,
+        "exports": {
+            export: name
+            for export, name in EXPORTS.items()
+            if f"{name}.npy" in files and f"{name}.json" in files
+        },
+    }
+
+
+def publish(
+    source_dir: str, base: str | None = None, root: str = SAVED_MODELS_PATH
+) -> str:
+    """
+    Add the files in `source_dir` to the store as an artifact, along with the files of the
+    `base` artifact that `source_dir` doesn't replace, if given
+
+    Returns: The artifact's hash
+    """
+    files = dict(read_manifest(base, root)["files"]) if base is not None else {}
+    for file in files.values():
+        _check_blob(file["sha256"], root)
+    for name in sorted(os.listdir(source_dir)):
+        path = os.path.join(source_dir, name)
+        if os.path.isfile(path):
+            files[name] = {
+                "sha256": _add_blob(path, root),
+                "size": os.path.getsize(path),
+            }
+
+    manifest = get_manifest(dict(sorted(files.items())))
+    manifest_json = json.dumps(manifest, indent=2, sort_keys=True)
+    artifact = hashlib.sha256(manifest_json.encode()).hexdigest()
+    artifact_path = get_artifact_path(artifact, root)
+    if os.path.isdir(artifact_path):
+        return artifact
+
+    scratch_dir = _make_scratch_dir(root)
+    for name, file in files.items():
+        os.link(_get_blob_path(file["sha256"], root), os.path.join(scratch_dir, name))
+    with open(os.path.join(scratch_dir, MANIFEST_NAME), "w") as f:
+        f.write(manifest_json)
+
+    os.makedirs(os.path.dirname(artifact_path), exist_ok=True)
+    try:
+        os.rename(scratch_dir, artifact_path)
+    except OSError:
+        # Published at the same time by another process, with the same contents
+        shutil.rmtree(scratch_dir)
+        return artifact
+
+    # So that files can't be added to or removed from the artifact through a tag
+    os.chmod(artifact_path, 0o555)
+    return artifact
+
+
+def read_manifest(artifact: str, root: str = SAVED_MODELS_PATH) -> dict:
+    with open(os.path.join(get_artifact_path(artifact, root), MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def resolve(name: str, root: str = SAVED_MODELS_PATH) -> str | None:
+    """
+    Cheap enough to poll, since it only reads the tag's link, to detect a tag being moved.
+
+    Returns: The hash of the artifact tagged `name`, or None if `name` isn't a tag, e.g. a
+    model saved as a plain directory
+    """
+    path = os.path.join(root, name)
+    if not os.path.islink(path):
+        return None
+    return os.path.basename(os.readlink(path))
+
+
+def tag(name: str, artifact: str, root: str = SAVED_MODELS_PATH):
+    """
+    Point the tag `name` at `artifact`, atomically replacing whatever it pointed at
+    """
+    assert os.path.isdir(
+        get_artifact_path(artifact, root)
+    ), f"no artifact '{artifact}' in the store"
+    path = os.path.join(root, name)
+    assert os.path.islink(path) or not os.path.exists(
+        path
+    ), f"'{path}' is a directory, adopt it into the store first"
+
+    scratch_link = os.path.join(root, f".{name}.{os.getpid()}.tmp")
+    os.symlink(os.path.join(STORE_NAME, "artifacts", artifact), scratch_link)
+    os.replace(scratch_link, path)
+
+
+@contextmanager
+def update_tag(name: str, root: str = SAVED_MODELS_PATH) -> Iterator[str]:
+    """
+    Yields a scratch directory to write new or replacement files for the model tagged `name`
+    into, since its artifact can't be changed. On exit they're published as a new artifact
+    with the rest of its files, and the tag is moved to it.
+    """
+    base = resolve(name, root)
+    assert base is not None, f"'{name}' isn't a tag"
+    scratch_dir = _make_scratch_dir(root)
+    try:
+        yield scratch_dir
+        tag(name, publish(scratch_dir, base=base, root=root), root)
+    finally:
+        shutil.rmtree(scratch_dir)
+
+
+def untag(name: str, root: str = SAVED_MODELS_PATH):
+    assert resolve(name, root) is not None, f"'{name}' isn't a tag"
+    os.remove(os.path.join(root, name))
+
+
+def list_tags(root: str = SAVED_MODELS_PATH) -> dict[str, str]:
+    """
+    Returns: The artifact each tag points at
+    """
+    if not os.path.isdir(root):
+        return {}
+    return {
+        name: artifact
+        for name in sorted(os.listdir(root))
+        if (artifact := resolve(name, root)) is not None
+    }
+
+
+def adopt(name: str, root: str = SAVED_MODELS_PATH) -> str:
+    """
+    Replace a model saved as a plain directory with a tag of the same name. The directory is
+    moved into the store's adopted/ directory rather than deleted.
+
+    Returns: The artifact's hash
+    """
+    path = os.path.join(root, name)
+    artifact = publish(path, root=root)
+    adopted_path = os.path.join(
+        get_store_path(root), "adopted", f"{name}-{time.time_ns()}"
+    )
+    os.makedirs(os.path.dirname(adopted_path), exist_ok=True)
+    os.rename(path, adopted_path)
+    tag(name, artifact, root)
+    return artifact
+
+
+def collect_garbage(root: str = SAVED_MODELS_PATH) -> tuple[int, int]:
+    """
+    Delete artifacts no tag points at, then blobs no artifact links to. Not to be run while
+    anything is being published.
+
+    Returns: The number of artifacts and blobs deleted
+    """
+    tagged = set(list_tags(root).values())
+    artifacts_path = os.path.join(get_store_path(root), "artifacts")
+    removed_artifacts = 0
+    for artifact in os.listdir(artifacts_path) if os.path.isdir(artifacts_path) else []:
+        if artifact not in tagged:
+            artifact_path = os.path.join(artifacts_path, artifact)
+            os.chmod(artifact_path, 0o755)
+            shutil.rmtree(artifact_path)
+            removed_artifacts += 1
+
+    blobs_path = os.path.join(get_store_path(root), "blobs")
+    removed_blobs = 0
+    for blob in os.listdir(blobs_path) if os.path.isdir(blobs_path) else []:
+        blob_path = os.path.join(blobs_path, blob)
+        # The blob's own name is its only link left
+        if os.stat(blob_path).st_nlink == 1:
+            os.remove(blob_path)
+            removed_blobs += 1
+
+    return removed_artifacts, removed_blobs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    publish_parser = commands.add_parser(
+        "publish", help="Add a directory of model files to the store"
+    )
+    publish_parser.add_argument("source_dir", type=str)
+    publish_parser.add_argument("--tag", type=str, default=None)
+
+    tag_parser = commands.add_parser(
+        "tag", help="Point a tag at an artifact, or at what another tag points at"
+    )
+    tag_parser.add_argument("name", type=str)
+    tag_parser.add_argument("target", type=str, help="Artifact hash or tag")
+
+    untag_parser = commands.add_parser("untag")
+    untag_parser.add_argument("name", type=str)
+
+    adopt_parser = commands.add_parser(
+        "adopt", help="Replace a model saved as a plain directory with a tag"
+    )
+    adopt_parser.add_argument("name", type=str)
+
+    commands.add_parser("list")
+    commands.add_parser("gc", help="Delete artifacts and blobs no tag refers to")
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        artifact = publish(args.source_dir)
+        print(artifact)
+        if args.tag is not None:
+            tag(args.tag, artifact)
+    elif args.command == "tag":
+        tag(args.name, resolve(args.target) or args.target)
+    elif args.command == "untag":
+        untag(args.name)
+    elif args.command == "adopt":
+        print(adopt(args.name))
+    elif args.command == "list":
+        for name, artifact in list_tags().items():
+            exports = read_manifest(artifact)["exports"]
+            print(f"{name:<24} {artifact[:16]} exports: {', '.join(exports) or '-'}")
+    elif args.command == "gc":
+        removed_artifacts, removed_blobs = collect_garbage()
+        print(f"removed {removed_artifacts} artifacts and {removed_blobs} blobs")
+
+
+if __name__ == "__main__":
+    main()
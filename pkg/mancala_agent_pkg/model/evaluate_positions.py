@@ -0,0 +1,355 @@
+"""
+Evaluates positions from a file in bulk, e.g. to re-score archived positions with a newly
+promoted model, without going through the inference API one position at a time.
+
+Positions are read in chunks, either as JSON lines of board states (as sent to the API) or from
+a game record file, and each chunk is evaluated and serialised by a worker process in one batch.
+Only a bounded number of chunks are in flight at once, and results are written out in the order
+the positions were read, so memory use doesn't grow with the size of the file.
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Iterator, TextIO
+
+import numpy as np
+from mancala_env.envs import kernel
+from mancala_env.envs.game_record import MAGIC, GameRecordReader, is_opponent_move
+
+from pkg.mancala_agent_pkg.model.infer import PROD_MODEL_NAME, get_q_net
+from pkg.mancala_agent_pkg.model.load_model import get_model_path
+from pkg.mancala_agent_pkg.model.numpy_policy import q_values
+from pkg.mancala_agent_pkg.model.quantized_policy import (
+    load_quantized_q_net_weights,
+    quantized_q_values,
+)
+
+INPUT_FORMATS = ["jsonl", "record"]
+AGENTS = ["dqn", "search"]
+
+
+def detect_format(path: str) -> str:
+    with open(path, "rb") as f:
+        return "record" if f.read(len(MAGIC)) == MAGIC else "jsonl"
+
+
+def iter_chunks(path: str, input_format: str, chunk_size: int) -> Iterator:
+    """
+    Returns: Chunks of about `chunk_size` positions, as lists of JSON lines or arrays of plies,
+    left for the workers to parse
+    """
+    if input_format == "record":
+        # Copied out of the memory map, so that only the chunk is sent to a worker
+        yield from map(np.array, GameRecordReader(path).iter_chunks(chunk_size))
+        return
+
+    with open(path) as f:
+        lines = []
+        for line in f:
+            if line.strip():
+                lines.append(line)
+            if len(lines) == chunk_size:
+                yield lines
+                lines = []
+        if lines:
+            yield lines
+
+
+def parse_chunk(chunk, input_format: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns: An (n, 14) array of boards, from the perspective of the player as in BoardState,
+    and whether it's the opponent to move in each
+    """
+    if input_format == "record":
+        return chunk["state"].astype(np.int64), is_opponent_move(chunk)
+
+    states = [json.loads(line) for line in chunk]
+    boards = np.array(
+        [
+            state["player_side"]
+            + [state["player_score"]]
+            + state["opponent_side"]
+            + [state["opponent_score"]]
+            for state in states
+        ]
+    )
+    assert np.all(
+        boards.sum(axis=1) == 48
+    ), "must always be exactly 48 gems in a board state"
+    return boards, np.array([state["opponent_to_start"] for state in states])
+
+
+@lru_cache(maxsize=None)
+def get_quantized_q_net(model_name: str):
+    return load_quantized_q_net_weights(get_model_path(model_name), mmap=True)[0]
+
+
+def dqn_values(boards: np.ndarray, model_name: str, quantized: bool) -> np.ndarray:
+    """
+    Returns: The model's Q-value of each action, for boards from the perspective of the side to
+    move
+    """
+    if quantized:
+        return quantized_q_values(get_quantized_q_net(model_name), boards)
+    return q_values(get_q_net(model_name), boards)
+
+
+def _expand(
+    boards: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns: The position after each legal move of each board, from the perspective of the side
+    to move in it, with the index of its board, the move, and whether the mover plays again
+    """
+    parents, actions = np.nonzero(kernel.legal_moves_batch(boards))
+    children = boards[parents]
+    plays_again = kernel.apply_moves(children, actions)
+    children[~plays_again] = kernel.flip(children[~plays_again])
+    return children, parents, actions, plays_again
+
+
+def _negamax(boards: np.ndarray, depth: int) -> np.ndarray:
+    """
+    Breadth-first minimax over the whole batch, a depth at a time, where a position's leaves are
+    scored by the difference between the stores.
+
+    Returns: The value of each board for the side to move in it
+    """
+    values = (boards[:, kernel.STORE] - boards[:, -1]).astype(np.float32)
+    if depth == 0:
+        return values
+
+    is_live = ~kernel.is_terminal_batch(boards)
+    if not is_live.any():
+        return values
+
+    children, parents, _, plays_again = _expand(boards[is_live])
+    child_values = _negamax(children, depth - 1)
+    child_values[~plays_again] *= -1
+    # Every live board has at least one legal move, and its children are consecutive
+    firsts = np.flatnonzero(np.r_[True, parents[1:] != parents[:-1]])
+    values[is_live] = np.maximum.reduceat(child_values, firsts)
+    return values
+
+
+def search_values(
+    boards: np.ndarray, depth: int, max_frontier: int = 1 << 20
+) -> np.ndarray:
+    """
+    Searches `depth` moves ahead (counting extra turns as moves) from each board, from the
+    perspective of the side to move, in slices small enough that no depth of the search holds
+    many more than `max_frontier` boards.
+
+    Returns: The minimax value of each action, NaN where it isn't legal
+    """
+    assert depth >= 1, "must search at least one move ahead"
+    values = np.full((len(boards), 6), np.nan, dtype=np.float32)
+    live_indices = np.flatnonzero(~kernel.is_terminal_batch(boards))
+    children, parents, actions, plays_again = _expand(boards[live_indices])
+
+    slice_size = max(1, max_frontier // 6 ** (depth - 1))
+    child_values = np.concatenate(
+        [np.empty(0, dtype=np.float32)]
+        + [
+            _negamax(children[start : start + slice_size], depth - 1)
+            for start in range(0, len(children), slice_size)
+        ]
+    )
+    child_values[~plays_again] *= -1
+    values[live_indices[parents], actions] = child_values
+    return values
+
+
+def evaluate_chunk(
+    chunk,
+    start_index: int,
+    input_format: str,
+    agent: str,
+    model_name: str = PROD_MODEL_NAME,
+    quantized: bool = False,
+    depth: int = 4,
+) -> str:
+    """
+    Run in the workers, which also serialise their results so that the main process only has to
+    read and write.
+
+    Returns: A JSON line for each position of the chunk, numbered from `start_index`, with
+    whether the game is over, the best legal move for the side to move and the value of each
+    action (null where it isn't legal)
+    """
+    boards, opponent_to_move = parse_chunk(chunk, input_format)
+    # Agents and the kernel see boards from the perspective of the side to move
+    mover_boards = np.where(opponent_to_move[:, None], kernel.flip(boards), boards)
+    is_game_over = kernel.is_terminal_batch(mover_boards)
+    is_legal = kernel.legal_moves_batch(mover_boards) & ~is_game_over[:, None]
+
+    if agent == "dqn":
+        values = dqn_values(mover_boards, model_name, quantized)
+    else:
+        values = search_values(mover_boards, depth)
+    best_moves = np.where(is_legal, values, -np.inf).argmax(axis=1)
+
+    lines = []
+    for i, (game_over, best_move, position_values, legal) in enumerate(
+        zip(
+            is_game_over.tolist(),
+            best_moves.tolist(),
+            # Adding 0 turns -0.0 into 0.0
+            (np.round(values.astype(np.float64), 4) + 0.0).tolist(),
+            is_legal.tolist(),
+        )
+    ):
+        lines.append(
+            json.dumps(
+                {
+                    "index": start_index + i,
+                    "game_over": game_over,
+                    "best_move": None if game_over else best_move,
+                    "values": [
+                        value if is_move_legal else None
+                        for value, is_move_legal in zip(position_values, legal)
+                    ],
+                }
+            )
+        )
+    return "".join(f"{line}\n" for line in lines)
+
+
+def evaluate_file(
+    path: str,
+    output: TextIO,
+    agent: str,
+    input_format: str | None = None,
+    chunk_size: int = 1 << 14,
+    n_workers: int = 1,
+    max_in_flight: int | None = None,
+    **agent_kwargs,
+) -> int:
+    """
+    Evaluates every position in the file, writing a JSON line for each to `output` in the order
+    they were read. With several workers, at most `max_in_flight` chunks (by default two per
+    worker, so workers don't wait on the main process) are read but not yet written.
+
+    Returns: The number of positions evaluated
+    """
+    assert agent in AGENTS, f"unknown agent '{agent}'"
+    input_format = input_format or detect_format(path)
+    chunks = iter_chunks(path, input_format, chunk_size)
+    n_positions = 0
+
+    if n_workers <= 1:
+        for chunk in chunks:
+            output.write(
+                evaluate_chunk(chunk, n_positions, input_format, agent, **agent_kwargs)
+            )
+            n_positions += len(chunk)
+        return n_positions
+
+    max_in_flight = max_in_flight or 2 * n_workers
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(
+                executor.submit(
+                    evaluate_chunk,
+                    chunk,
+                    n_positions,
+                    input_format,
+                    agent,
+                    **agent_kwargs,
+                )
+            )
+            n_positions += len(chunk)
+            if len(pending) >= max_in_flight:
+                output.write(pending.popleft().result())
+        while pending:
+            output.write(pending.popleft().result())
+
+    return n_positions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "input",
+        type=str,
+        help="JSON lines of board states, as sent to the inference API, or a game record file",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default="-",
+        help="File to write a JSON line per position to, in input order. Defaults to stdout",
+    )
+    parser.add_argument(
+        "--format",
+        type=str,
+        default=None,
+        choices=INPUT_FORMATS,
+        help="Format of the input, detected from its header by default",
+    )
+    parser.add_argument("--agent", type=str, default="dqn", choices=AGENTS)
+    parser.add_argument(
+        "--model", type=str, default=PROD_MODEL_NAME, help="Saved model for --agent dqn"
+    )
+    parser.add_argument(
+        "--quantized",
+        action="store_true",
+        default=False,
+        help="Evaluate with the model's int8 export rather than its float weights",
+    )
+    parser.add_argument(
+        "--depth", type=int, default=4, help="Moves searched ahead by --agent search"
+    )
+    parser.add_argument("--chunk-size", type=int, default=1 << 14)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=None,
+        help="Chunks read but not yet written at once, which bounds memory use. Defaults to "
+        "two per worker",
+    )
+    args = parser.parse_args()
+
+    if args.agent == "dqn":
+        agent_kwargs = dict(model_name=args.model, quantized=args.quantized)
+        # Loaded before the workers are forked, so that they share the weights
+        dqn_values(np.zeros((1, 14), dtype=np.int64), **agent_kwargs)
+    else:
+        agent_kwargs = dict(depth=args.depth)
+
+    start = time.perf_counter()
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        n_positions = evaluate_file(
+            args.input,
+            output,
+            args.agent,
+            input_format=args.format,
+            chunk_size=args.chunk_size,
+            n_workers=args.workers,
+            max_in_flight=args.max_in_flight,
+            **agent_kwargs,
+        )
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    # On stderr, since the results may be on stdout
+    print(
+        f"evaluated {n_positions} positions in {elapsed:.1f}s "
+        f"({n_positions / elapsed:,.0f} positions/s)",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+
+import gymnasium as gym
+import numpy as np
+
+import mancala_env  # noqa: F401 is used
+from mancala_env.envs.game_record import GameRecordWriter
+import pkg.mancala_agent_pkg.model.opponent_policy as op
+from pkg.mancala_agent_pkg.model.infer import get_policy
+
+
+def get_policy_by_name(name: str):
+    """
+    Returns: A policy for the model saved as `name`, or random valid moves if `name` is 'random'
+    """
+    if name == "random":
+        return op.random_opponent_policy
+    return get_policy(name)
+
+
+def export_games(
+    output_path: str, n_games: int, agent: str, opponent: str, seed: int | None
+):
+    # Separate streams for the agent's and the env's (and so the opponent's) random choices
+    agent_seed, env_seed = np.random.SeedSequence(seed).spawn(2)
+    agent_rng = np.random.default_rng(agent_seed)
+    agent_policy = get_policy_by_name(agent)
+    env = gym.make(
+        "Mancala-v0",
+        max_episode_steps=100,
+        opponent_policy=get_policy_by_name(opponent),
+    )
+
+    with GameRecordWriter(output_path) as writer:
+        env.unwrapped.record_games_to(writer)
+        for game in range(n_games):
+            obs, _ = env.reset(
+                seed=int(env_seed.generate_state(1)[0]) if game == 0 else None
+            )
+            terminated = truncated = False
+            while not (terminated or truncated):
+                obs, _, terminated, truncated, _ = env.step(
+                    agent_policy(agent_rng, obs)
+                )
+        env.unwrapped.end_game_record()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("output", type=str, help="Game record file to append games to")
+    parser.add_argument("-n", "--n-games", type=int, default=10_000)
+    parser.add_argument(
+        "--agent",
+        type=str,
+        default="prod",
+        help="Saved model playing as the player, or 'random'",
+    )
+    parser.add_argument(
+        "--opponent",
+        type=str,
+        default="random",
+        help="Saved model playing as the opponent, or 'random'",
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    export_games(args.output, args.n_games, args.agent, args.opponent, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import argparse
+import logging
+import multiprocessing as mp
+import os
+
+import gymnasium as gym
+import numpy as np
+import optuna
+from optuna.storages import RDBStorage, RetryFailedTrialCallback
+from optuna.study import MaxTrialsCallback
+from optuna.trial import TrialState
+import torch
+from stable_baselines3 import DQN
+from stable_baselines3.common.callbacks import EvalCallback
+from stable_baselines3.common.monitor import Monitor
+
+import mancala_env  # noqa: F401 is used
+import pkg.mancala_agent_pkg.model.opponent_policy as op
+from pkg.mancala_agent_pkg.model.load_model import load_model
+from pkg.mancala_agent_pkg.model.numpy_policy import (
+    QNetWeights,
+    get_q_net_weights,
+    get_numpy_opponent_policy,
+)
+
+logger = logging.getLogger(__name__)
+
+NET_ARCHS = {"tiny": [64], "small": [64, 64], "medium": [256, 256]}
+
+
+class TrialEvalCallback(EvalCallback):
+    """
+    Streams each periodic evaluation to optuna, stopping training early if the trial is pruned.
+    """
+
+    def __init__(self, eval_env: gym.Env, trial: optuna.Trial, **kwargs):
+        super().__init__(eval_env, **kwargs)
+        self.trial = trial
+        self.eval_idx = 0
+        self.is_pruned = False
+
+    def _on_step(self) -> bool:
+        if self.eval_freq > 0 and self.n_calls % self.eval_freq == 0:
+            super()._on_step()
+            self.eval_idx += 1
+            self.trial.report(self.last_mean_reward, self.eval_idx)
+            if self.trial.should_prune():
+                self.is_pruned = True
+                return False
+        return True
+
+
+def sample_dqn_params(trial: optuna.Trial) -> dict:
+    train_freq = trial.suggest_categorical("train_freq", [1, 4, 8, 16, 128, 256])
+    return {
+        "learning_rate": trial.suggest_float("learning_rate", 1e-5, 1e-2, log=True),
+        "batch_size": trial.suggest_categorical("batch_size", [32, 64, 100, 128, 256]),
+        "buffer_size": trial.suggest_categorical(
+            "buffer_size", [10_000, 50_000, 100_000]
+        ),
+        "learning_starts": trial.suggest_categorical(
+            "learning_starts", [0, 1000, 5000]
+        ),
+        "gamma": trial.suggest_categorical("gamma", [0.9, 0.95, 0.98, 0.99, 0.995]),
+        "target_update_interval": trial.suggest_categorical(
+            "target_update_interval", [1, 1000, 5000, 10000]
+        ),
+        "train_freq": train_freq,
+        "gradient_steps": max(train_freq // 4, 1),
+        "exploration_fraction": trial.suggest_float("exploration_fraction", 0, 0.5),
+        "exploration_final_eps": trial.suggest_float("exploration_final_eps", 0, 0.2),
+        "policy_kwargs": dict(
+            net_arch=NET_ARCHS[
+                trial.suggest_categorical("net_arch", list(NET_ARCHS.keys()))
+            ]
+        ),
+    }
+
+
+def make_env(opponent_policy) -> gym.Env:
+    return gym.make(
+        "Mancala-v0",
+        max_episode_steps=100,
+        opponent_policy=opponent_policy,
+    )
+
+
+def get_seed(seed_sequence: np.random.SeedSequence) -> int:
+    return int(seed_sequence.generate_state(1)[0])
+
+
+def get_objective(
+    opponent_policy, args: argparse.Namespace, worker_seed: np.random.SeedSequence
+):
+    def objective(trial: optuna.Trial) -> float:
+        # Each trial spawns its own seeds, so a worker's trials are reproducible in order
+        model_seed, eval_seed = worker_seed.spawn(2)
+        model = DQN(
+            "MlpPolicy",
+            make_env(opponent_policy),
+            seed=get_seed(model_seed),
+            **sample_dqn_params(trial),
+        )
+        eval_callback = TrialEvalCallback(
+            Monitor(make_env(opponent_policy)),
+            trial,
+            eval_freq=args.n_timesteps // args.n_evaluations,
+            n_eval_episodes=args.n_eval_episodes,
+            deterministic=True,
+            verbose=0,
+        )
+        eval_callback.eval_env.seed(get_seed(eval_seed))
+
+        try:
+            model.learn(total_timesteps=args.n_timesteps, callback=eval_callback)
+        except (AssertionError, ValueError) as e:
+            # Sampled hyperparameters can produce NaNs, which is not a reason to stop the search
+            logger.warning(f"trial '{trial.number}' failed: {e}")
+            raise optuna.TrialPruned()
+        finally:
+            model.env.close()
+            eval_callback.eval_env.close()
+
+        if eval_callback.is_pruned:
+            raise optuna.TrialPruned()
+
+        return eval_callback.last_mean_reward
+
+    return objective
+
+
+def get_storage(url: str) -> RDBStorage:
+    # The heartbeat lets a resumed search detect trials that were interrupted mid-run and retry them
+    return RDBStorage(
+        url,
+        engine_kwargs={"connect_args": {"timeout": 60}},
+        heartbeat_interval=60,
+        failed_trial_callback=RetryFailedTrialCallback(max_retry=1),
+    )
+
+
+def run_worker(
+    worker_seed: np.random.SeedSequence,
+    args: argparse.Namespace,
+    opponent_weights: QNetWeights | None,
+    opponent_exploration_rate: float,
+):
+    # Each worker is a single core; the parallelism comes from the number of workers
+    torch.set_num_threads(1)
+    sampler_seed, trials_seed = worker_seed.spawn(2)
+
+    if opponent_weights is None:
+        opponent_policy = op.random_opponent_policy
+    else:
+        opponent_policy = get_numpy_opponent_policy(
+            opponent_weights, exploration_rate=opponent_exploration_rate
+        )
+
+    study = optuna.load_study(
+        study_name=args.study_name,
+        storage=get_storage(args.storage),
+        sampler=optuna.samplers.TPESampler(
+            n_startup_trials=args.n_startup_trials, seed=get_seed(sampler_seed)
+        ),
+        pruner=optuna.pruners.MedianPruner(
+            n_startup_trials=args.n_startup_trials,
+            n_warmup_steps=args.n_evaluations // 3,
+        ),
+    )
+    study.optimize(
+        get_objective(opponent_policy, args, trials_seed),
+        callbacks=[
+            MaxTrialsCallback(
+                args.n_trials, states=(TrialState.COMPLETE, TrialState.PRUNED)
+            )
+        ],
+        gc_after_trial=True,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--n-trials",
+        type=int,
+        default=100,
+        help="Total number of trials in the study, including those run before resuming",
+    )
+    parser.add_argument(
+        "--n-workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of worker processes running trials in parallel",
+    )
+    parser.add_argument(
+        "-n", "--n-timesteps", type=int, default=50_000, help="Timesteps per trial"
+    )
+    parser.add_argument(
+        "--n-evaluations",
+        type=int,
+        default=10,
+        help="Number of evaluations per trial, each of which can prune it",
+    )
+    parser.add_argument(
+        "--n-eval-episodes", type=int, default=40, help="Episodes per evaluation"
+    )
+    parser.add_argument(
+        "--n-startup-trials",
+        type=int,
+        default=10,
+        help="Trials to sample randomly and run without pruning",
+    )
+    parser.add_argument(
+        "--opponent",
+        type=str,
+        default="opponent",
+        help="Saved model to tune against, or 'random' for random valid moves",
+    )
+    parser.add_argument("--study-name", type=str, default="dqn-mancala")
+    parser.add_argument(
+        "--log-folder",
+        type=str,
+        default="last_tuning_run/",
+        help="Directory for logs and the study database, if no storage is given",
+    )
+    parser.add_argument(
+        "--storage",
+        type=str,
+        default=None,
+        help="Optuna storage url, defaults to a SQLite database in the log folder",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.log_folder, exist_ok=True)
+    if args.storage is None:
+        args.storage = f"sqlite:///{os.path.join(args.log_folder, 'study.db')}"
+
+    logging.basicConfig(
+        filename=os.path.join(args.log_folder, "tune.log"),
+        level=logging.INFO,
+        format="%(asctime)s [%(processName)s] - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    # Create up front so workers don't race to create it
+    optuna.create_study(
+        study_name=args.study_name,
+        storage=get_storage(args.storage),
+        direction="maximize",
+        load_if_exists=True,
+    )
+
+    # Load the opponent once, as NumPy weights shared with the forked workers
+    opponent_weights, opponent_exploration_rate = None, 0.0
+    if args.opponent != "random":
+        opponent_model = load_model(args.opponent)
+        opponent_weights = get_q_net_weights(opponent_model)
+        opponent_exploration_rate = opponent_model.exploration_rate
+        del opponent_model
+
+    logger.info(f"starting search with '{args.n_workers}' workers")
+    context = mp.get_context("fork")
+    workers = [
+        context.Process(
+            target=run_worker,
+            args=(worker_seed, args, opponent_weights, opponent_exploration_rate),
+            name=f"tuning-worker-{i}",
+        )
+        for i, worker_seed in enumerate(
+            np.random.SeedSequence(args.seed).spawn(args.n_workers)
+        )
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    study = optuna.load_study(study_name=args.study_name, storage=args.storage)
+    completed = study.get_trials(states=(TrialState.COMPLETE,))
+    print(f"Finished trials: {len(study.trials)}, completed: {len(completed)}")
+    if completed:
+        print(f"Best mean reward: {study.best_value}")
+        print(f"Best params: {study.best_params}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,156 @@
-import gymnasium as gym
+import os
+from functools import lru_cache
+
 import numpy as np
 
-import mancala_env  # noqa: F401 is used
+from pkg.mancala_agent_pkg.model import artifacts
 from pkg.mancala_agent_pkg.model.opponent_policy import get_saved_opponent_policy
-from pkg.mancala_agent_pkg.model.load_model import load_model
+from pkg.mancala_agent_pkg.model.load_model import get_model_path, load_model_from
+from pkg.mancala_agent_pkg.model.numpy_policy import (
+    QNetWeights,
+    is_exported,
+    load_q_net_weights,
+    get_q_net_weights,
+    get_numpy_opponent_policy,
+    q_values,
+)
+from pkg.mancala_agent_pkg.model.quantized_policy import (
+    QuantizedQNetWeights,
+    is_quantized_exported,
+    load_quantized_q_net_weights,
+    get_quantized_opponent_policy,
+    quantized_q_values,
+)
+
+PROD_MODEL_NAME = "prod"
+INITIAL_OBSERVATION = np.array([4] * 6 + [0] + [4] * 6 + [0])
+
+# Serve from the model's int8 export rather than its float one, if it has been quantized
+SERVE_QUANTIZED = os.environ.get("MANCALA_SERVE_QUANTIZED", "0") == "1"
+
+# Random choices made while serving, e.g. exploration. Freshly seeded in each forked worker,
+# which would otherwise all make the same choices as each other.
+rng = np.random.default_rng()
+
+
+def _reseed_rng():
+    global rng
+    rng = np.random.default_rng()
+
+
+os.register_at_fork(after_in_child=_reseed_rng)
+
+
+@lru_cache(maxsize=None)
+def get_exported_q_net(model_name: str) -> tuple[QNetWeights, float]:
+    """
+    Returns: The exported Q-network weights, memory-mapped so that processes serving the same
+    model share them, and the exploration rate the model was saved with
+    """
+    return load_q_net_weights(get_model_path(model_name), mmap=True)
+
+
+@lru_cache(maxsize=None)
+def get_q_net(model_name: str) -> QNetWeights:
+    """
+    Returns: The model's Q-network weights as NumPy arrays, from its export if it has one and
+    otherwise copied out of the saved model
+    """
+    model_dir = get_model_path(model_name)
+    if is_exported(model_dir):
+        return get_exported_q_net(model_name)[0]
+
+    return get_q_net_weights(load_model_from(model_dir))
+
+
+@lru_cache(maxsize=None)
+def get_quantized_q_net(model_name: str) -> tuple[QuantizedQNetWeights, float]:
+    """
+    Returns: The model's int8 export, memory-mapped like get_exported_q_net, and the exploration
+    rate the model was saved with
+    """
+    return load_quantized_q_net_weights(get_model_path(model_name), mmap=True)
+
+
+def is_serving_quantized(model_name: str) -> bool:
+    return SERVE_QUANTIZED and is_quantized_exported(get_model_path(model_name))
+
+
+def get_served_q_values(model_name: str, observations: np.array) -> np.array:
+    """
+    Returns: An (n, 6) array of Q-values for an (n, 14) array of observations, from the same
+    weights get_policy serves for the model
+    """
+    if is_serving_quantized(model_name):
+        return quantized_q_values(get_quantized_q_net(model_name)[0], observations)
+    return q_values(get_q_net(model_name), observations)
+
+
+@lru_cache(maxsize=None)
+def get_loaded_artifact(model_name: str) -> str | None:
+    """
+    Returns: The artifact the model's tag pointed at when it was loaded by this process, or
+    None if it isn't a tag
+    """
+    return artifacts.resolve(model_name)
+
+
+def is_model_outdated(model_name: str = PROD_MODEL_NAME) -> bool:
+    """
+    Returns: Whether the model's tag has moved since it was loaded, so a restarted process
+    would serve another model
+    """
+    return get_loaded_artifact(model_name) != artifacts.resolve(model_name)
+
+
+@lru_cache(maxsize=None)
+def get_policy(model_name: str):
+    """
+    Loads a model's policy once per process. Exported NumPy weights are preferred, since serving
+    from them doesn't need torch or stable_baselines3 to be imported at all.
+    """
+    get_loaded_artifact(model_name)
+    model_dir = get_model_path(model_name)
+    if is_serving_quantized(model_name):
+        quantized, exploration_rate = get_quantized_q_net(model_name)
+        return get_quantized_opponent_policy(
+            quantized, exploration_rate=exploration_rate
+        )
+
+    if is_exported(model_dir):
+        weights, exploration_rate = get_exported_q_net(model_name)
+        return get_numpy_opponent_policy(weights, exploration_rate=exploration_rate)
+
+    return get_saved_opponent_policy(model_name, deterministic=False)
+
+
+@lru_cache(maxsize=None)
+def get_model_version(model_name: str) -> str:
+    """
+    Returns: An identifier for the weights get_policy serves for the model in this process
+    """
+    weights = "int8" if is_serving_quantized(model_name) else "float"
+    return f"{model_name}@{get_loaded_artifact(model_name) or 'dir'}:{weights}"
+
+
+def warm_up(model_name: str = PROD_MODEL_NAME):
+    """
+    Load the model and run an inference, so the first request doesn't pay for either
+    """
+    get_policy(model_name)(rng, INITIAL_OBSERVATION)
 
 
 def infer_from_observation(observation: np.array) -> int:
-    opponent_policy = get_saved_opponent_policy("prod", deterministic=False)
-    action = opponent_policy(seed=None, observation=observation)
+    action = get_policy(PROD_MODEL_NAME)(rng, observation)
     return int(action)
 
 
 if __name__ == "__main__":
+    import gymnasium as gym
+
+    import mancala_env  # noqa: F401 is used
+    from pkg.mancala_agent_pkg.model.load_model import load_model
+
     env = gym.make("Mancala-v0", max_episode_steps=100)
     model = load_model("prod")
 
@@ -1,12 +1,29 @@
 import os
-from stable_baselines3 import DQN
-from stable_baselines3.common.base_class import BaseAlgorithm
+from typing import TYPE_CHECKING
 
+# stable_baselines3 is only imported when a model is actually loaded, so that importing this
+# module (e.g. when serving from exported weights) doesn't pay for importing torch
+if TYPE_CHECKING:
+    from stable_baselines3.common.base_class import BaseAlgorithm
 
-def load_model(model: str) -> BaseAlgorithm:
-    model_path = f"./saved_models/{model}/best_model"
+
+SAVED_MODELS_PATH = "./saved_models"
+
+
+def get_model_path(model: str) -> str:
+    return f"{SAVED_MODELS_PATH}/{model}"
+
+
+def load_model_from(model_dir: str) -> "BaseAlgorithm":
+    from stable_baselines3 import DQN
+
+    model_path = f"{model_dir}/best_model"
     assert os.path.isfile(
         f"{model_path}.zip"
     ), f"{model_path}.zip must exist if using saved opponent policy"
 
     return DQN.load(model_path)
+
+
+def load_model(model: str) -> "BaseAlgorithm":
+    return load_model_from(get_model_path(model))
@@ -0,0 +1,168 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from pkg.mancala_agent_pkg.model.opponent_policy import get_random_valid_move
+from pkg.mancala_agent_pkg.model.load_model import get_model_path, load_model_from
+
+# (weight, bias) for each linear layer of the Q-network, with weight shaped
+# (out_features, in_features) as in torch
+QNetWeights = list[tuple[np.ndarray, np.ndarray]]
+
+# Matches MancalaEnv.observation_space: MultiDiscrete([49] * 14), which stable_baselines3 one-hot
+# encodes pit by pit before the first linear layer
+OBSERVATION_NVEC = np.array([49] * 14)
+FEATURE_OFFSETS = np.concatenate([[0], np.cumsum(OBSERVATION_NVEC)[:-1]])
+
+# Exported weights are saved alongside best_model.zip as q_net.npy (every array flattened into
+# one float32 array) and q_net.json (the layer shapes and exploration rate)
+Q_NET_EXPORT_NAME = "q_net"
+
+
+def get_q_net_weights(model) -> QNetWeights:
+    """
+    Copy the Q-network of a stable_baselines3 DQN out into float32 NumPy arrays.
+    Assumes the default MlpPolicy architecture of Linear layers separated by ReLUs.
+    """
+    weights = []
+    for layer in model.q_net.q_net:
+        if hasattr(layer, "weight"):
+            weights.append(
+                (
+                    layer.weight.detach().cpu().numpy().astype(np.float32),
+                    layer.bias.detach().cpu().numpy().astype(np.float32),
+                )
+            )
+    return weights
+
+
+def get_export_prefix(model_dir: str) -> str:
+    return os.path.join(model_dir, Q_NET_EXPORT_NAME)
+
+
+def is_exported(model_dir: str) -> bool:
+    return os.path.isfile(f"{get_export_prefix(model_dir)}.json")
+
+
+def save_q_net_weights(weights: QNetWeights, exploration_rate: float, model_dir: str):
+    prefix = get_export_prefix(model_dir)
+    flat = np.concatenate([array.ravel() for layer in weights for array in layer])
+    np.save(f"{prefix}.npy", flat.astype(np.float32))
+
+    with open(f"{prefix}.json", "w") as f:
+        json.dump(
+            {
+                "shapes": [[list(array.shape) for array in layer] for layer in weights],
+                "exploration_rate": exploration_rate,
+            },
+            f,
+        )
+
+
+def load_q_net_weights(model_dir: str, mmap: bool = False) -> tuple[QNetWeights, float]:
+    """
+    Optionally memory-maps the weights read-only rather than reading them into memory, so that
+    every process serving the same model shares one copy of them through the page cache.
+
+    Returns: The exported Q-network weights and the exploration rate the model was saved with
+    """
+    prefix = get_export_prefix(model_dir)
+    with open(f"{prefix}.json") as f:
+        metadata = json.load(f)
+    flat = np.load(f"{prefix}.npy", mmap_mode="r" if mmap else None)
+
+    weights, offset = [], 0
+    for shapes in metadata["shapes"]:
+        layer = []
+        for shape in shapes:
+            size = int(np.prod(shape))
+            layer.append(flat[offset : offset + size].reshape(shape))
+            offset += size
+        weights.append(tuple(layer))
+
+    return weights, metadata["exploration_rate"]
+
+
+def export_saved_model(model_dir: str, export_dir: str | None = None):
+    """
+    Export the Q-network of the model saved in `model_dir` so it can be served without torch,
+    into `export_dir` if given and otherwise alongside the model
+    """
+    model = load_model_from(model_dir)
+    save_q_net_weights(
+        get_q_net_weights(model), model.exploration_rate, export_dir or model_dir
+    )
+
+
+def q_values(weights: QNetWeights, observations: np.array) -> np.array:
+    """
+    Batched forward pass of the Q-network.
+
+    Returns: An (n, 6) array of Q-values for an (n, 14) array of observations
+    """
+    observations = np.atleast_2d(observations)
+
+    # The one-hot encoded input is all zeros apart from one feature per pit, so the first
+    # layer reduces to summing the weight columns of those features
+    weight, bias = weights[0]
+    hidden = weight.T[observations.astype(np.intp) + FEATURE_OFFSETS].sum(axis=1) + bias
+
+    for weight, bias in weights[1:]:
+        np.maximum(hidden, 0.0, out=hidden)
+        hidden = hidden @ weight.T + bias
+
+    return hidden
+
+
+def best_valid_actions(values: np.array, observations: np.array) -> np.array:
+    """
+    Returns: The highest valued action for each row, only considering pits on the side to move
+    that contain gems
+    """
+    observations = np.atleast_2d(observations)
+    return np.where(observations[:, :6] > 0, values, -np.inf).argmax(axis=1)
+
+
+def get_numpy_opponent_policy(weights: QNetWeights, exploration_rate: float = 0.0):
+    """
+    Opponent policy equivalent to a saved DQN opponent, but evaluated in NumPy and never
+    playing an invalid move.
+    """
+
+    # Observation from the perspective of the opponent
+    def numpy_opponent_policy(rng: np.random.Generator, observation: np.array) -> int:
+        opponent_side = observation[:6]
+        assert sum(opponent_side) > 0, "Opponent has no valid moves"
+
+        if exploration_rate > 0 and rng.random() < exploration_rate:
+            return get_random_valid_move(opponent_side, rng)
+
+        return int(best_valid_actions(q_values(weights, observation), observation)[0])
+
+    return numpy_opponent_policy
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--model", type=str, default="prod", help="Name of the saved model to export"
+    )
+    args = parser.parse_args()
+
+    # Imported here, since the store imports this module for the name of the export
+    from pkg.mancala_agent_pkg.model import artifacts
+
+    model_dir = get_model_path(args.model)
+    if artifacts.resolve(args.model) is None:
+        export_saved_model(model_dir)
+        print(f"exported weights to '{get_export_prefix(model_dir)}'")
+    else:
+        # Stored models can't be changed, so the tag is moved to a copy with the weights added
+        with artifacts.update_tag(args.model) as scratch_dir:
+            export_saved_model(model_dir, scratch_dir)
+        print(
+            f"exported weights to '{args.model}', "
+            f"now artifact '{artifacts.resolve(args.model)}'"
+        )
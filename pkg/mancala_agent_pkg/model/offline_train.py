@@ -0,0 +1,232 @@
+import argparse
+import logging
+
+import gymnasium as gym
+import numpy as np
+import torch
+import torch.nn.functional as F
+from stable_baselines3 import DQN
+
+import mancala_env  # noqa: F401 is used
+from mancala_env.envs.mancala import get_player_reward
+from mancala_env.envs.game_record import (
+    GameRecordReader,
+    get_actions,
+    is_final,
+    is_opponent_move,
+)
+import pkg.mancala_agent_pkg.model.opponent_policy as op
+import pkg.mancala_agent_pkg.model.save as save
+from pkg.mancala_agent_pkg.model.load_model import load_model
+
+logger = logging.getLogger(__name__)
+
+
+def get_transitions(plies: np.array) -> dict[str, np.array]:
+    """
+    Convert whole recorded games into the player's transitions: from each state the player moved
+    from, to the next state the player moves from (after any opponent moves) or the end of the
+    game, with the reward the env would have given for that step.
+    """
+    final = is_final(plies)
+    # The states a transition can end on. A game's final row always ends it, so the next
+    # candidate after a player move is always in the same game.
+    candidates = np.flatnonzero(final | ~is_opponent_move(plies))
+    is_decision = ~final[candidates[:-1]]
+    starts = candidates[:-1][is_decision]
+    ends = candidates[1:][is_decision]
+
+    next_states = plies["state"][ends].astype(np.int64)
+    # Unfinished games stop early, so only empty sides mean the game really ended
+    dones = (next_states[:, :6].sum(axis=1) == 0) | (
+        next_states[:, 7:13].sum(axis=1) == 0
+    )
+
+    return {
+        "observations": plies["state"][starts].astype(np.int64),
+        "actions": get_actions(plies[starts]).astype(np.int64),
+        "rewards": get_player_reward(
+            next_states[:, 6], next_states[:, 13], dones
+        ).astype(np.float32),
+        "next_observations": next_states,
+        "dones": dones.astype(np.float32),
+    }
+
+
+def get_model(model_name: str | None) -> DQN:
+    if model_name is not None:
+        return load_model(model_name)
+
+    env = gym.make(
+        "Mancala-v0",
+        max_episode_steps=100,
+        opponent_policy=op.random_opponent_policy,
+    )
+    return DQN("MlpPolicy", env, policy_kwargs=dict(net_arch=[256, 256]))
+
+
+class OfflineTrainer:
+    """
+    Trains a DQN's Q-network from minibatches of recorded transitions, either with the same TD
+    loss DQN uses online, or by behaviour cloning the recorded moves.
+    """
+
+    def __init__(
+        self,
+        model: DQN,
+        mode: str,
+        learning_rate: float,
+        gamma: float,
+        target_update_interval: int,
+    ):
+        assert mode in ["dqn", "bc"], f"unknown offline training mode '{mode}'"
+        self.model = model
+        self.mode = mode
+        self.gamma = gamma
+        self.target_update_interval = target_update_interval
+        self.n_updates = 0
+        self.model.policy.set_training_mode(True)
+        for param_group in self.model.policy.optimizer.param_groups:
+            param_group["lr"] = learning_rate
+
+    def _to_tensor(self, array: np.array) -> torch.Tensor:
+        return torch.as_tensor(array, device=self.model.device)
+
+    def train_on_batch(self, batch: dict[str, np.array]) -> float:
+        observations = self._to_tensor(batch["observations"])
+        actions = self._to_tensor(batch["actions"]).reshape(-1, 1)
+        q_values = self.model.q_net(observations)
+
+        if self.mode == "bc":
+            loss = F.cross_entropy(q_values, actions.flatten())
+        else:
+            with torch.no_grad():
+                next_q_values = self.model.q_net_target(
+                    self._to_tensor(batch["next_observations"])
+                ).max(dim=1)[0]
+                target_q_values = (
+                    self._to_tensor(batch["rewards"])
+                    + (1 - self._to_tensor(batch["dones"])) * self.gamma * next_q_values
+                )
+            loss = F.smooth_l1_loss(
+                torch.gather(q_values, dim=1, index=actions).flatten(), target_q_values
+            )
+
+        optimizer = self.model.policy.optimizer
+        optimizer.zero_grad()
+        loss.backward()
+        torch.nn.utils.clip_grad_norm_(
+            self.model.policy.parameters(), self.model.max_grad_norm
+        )
+        optimizer.step()
+
+        self.n_updates += 1
+        if self.n_updates % self.target_update_interval == 0:
+            self.model.q_net_target.load_state_dict(self.model.q_net.state_dict())
+
+        return loss.item()
+
+
+def train_offline(
+    record_paths: list[str],
+    trainer: OfflineTrainer,
+    n_epochs: int,
+    batch_size: int,
+    chunk_plies: int,
+    only_wins: bool,
+    rng: np.random.Generator,
+):
+    """
+    Streams the records from disk a chunk at a time, so memory use is bounded by the chunk size
+    rather than the size of the dataset
+    """
+    for epoch in range(n_epochs):
+        losses = []
+        for path in record_paths:
+            for chunk in GameRecordReader(path).iter_chunks(chunk_plies):
+                if only_wins:
+                    chunk = chunk[chunk["outcome"] == 1]
+                transitions = get_transitions(np.asarray(chunk))
+
+                order = rng.permutation(len(transitions["actions"]))
+                for start in range(0, len(order), batch_size):
+                    indices = order[start : start + batch_size]
+                    losses.append(
+                        trainer.train_on_batch(
+                            {key: value[indices] for key, value in transitions.items()}
+                        )
+                    )
+
+        logger.info(
+            f"epoch '{epoch}' mean loss: '{np.mean(losses) if losses else None}'"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("records", type=str, nargs="+", help="Game record files")
+    parser.add_argument(
+        "--mode",
+        type=str,
+        default="dqn",
+        choices=["dqn", "bc"],
+        help="'dqn' for offline Q-learning, 'bc' to behaviour clone the recorded moves",
+    )
+    parser.add_argument(
+        "--model",
+        type=str,
+        default=None,
+        help="Saved model to continue training from, otherwise a new model is trained",
+    )
+    parser.add_argument("--n-epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=4096)
+    parser.add_argument("--learning-rate", type=float, default=1e-3)
+    parser.add_argument("--gamma", type=float, default=0.99)
+    parser.add_argument(
+        "--target-update-interval",
+        type=int,
+        default=100,
+        help="Gradient steps between copies of the Q-network into the target network",
+    )
+    parser.add_argument(
+        "--chunk-plies",
+        type=int,
+        default=1 << 20,
+        help="Plies read from disk at a time, which bounds memory use",
+    )
+    parser.add_argument(
+        "--only-wins",
+        action="store_true",
+        default=False,
+        help="Only train on games the recorded player won, e.g. for behaviour cloning",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    model = get_model(args.model)
+    trainer = OfflineTrainer(
+        model,
+        args.mode,
+        args.learning_rate,
+        args.gamma,
+        args.target_update_interval,
+    )
+    train_offline(
+        args.records,
+        trainer,
+        args.n_epochs,
+        args.batch_size,
+        args.chunk_plies,
+        args.only_wins,
+        np.random.default_rng(args.seed),
+    )
+
+    # Same arguments as save.export_weights, so the run directory is only wiped once
+    model.save(f"{save.get_last_run_path(True)}/best_model")
+    save.export_weights(new_run=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,27 +3,36 @@ import numpy as np
 from pkg.mancala_agent_pkg.model.load_model import load_model
 
 
-def get_random_valid_move(opponent_side: np.array) -> int:
-    assert sum(opponent_side) > 0, "Opponent has no valid moves"
+def get_random_valid_moves(sides: np.array, rng: np.random.Generator) -> np.array:
+    """
+    Returns: A uniformly random pit that contains gems for each row of an (n, 6) array of sides
+    """
+    sides = np.atleast_2d(sides)
+    is_valid = sides > 0
+    assert is_valid.any(axis=1).all(), "Opponent has no valid moves"
 
-    random_action = np.random.randint(0, 6)
-    while opponent_side[random_action] == 0:
-        random_action = np.random.randint(0, 6)
+    # The valid pit with the highest random key is a uniform choice between the valid pits
+    return np.where(is_valid, rng.random(sides.shape), -1.0).argmax(axis=1)
 
-    return random_action
+
+def get_random_valid_move(opponent_side: np.array, rng: np.random.Generator) -> int:
+    # Cheaper than the batched version for a single side
+    valid_moves = np.flatnonzero(opponent_side)
+    assert len(valid_moves) > 0, "Opponent has no valid moves"
+    return int(valid_moves[int(rng.random() * len(valid_moves))])
 
 
 # Observation from the perspective of the opponent
-def random_opponent_policy(seed: int, observation: np.array) -> int:
+def random_opponent_policy(rng: np.random.Generator, observation: np.array) -> int:
     # Extract opponent side
-    return get_random_valid_move(observation[:6])
+    return get_random_valid_move(observation[:6], rng)
 
 
 def get_saved_opponent_policy(model_name: str, deterministic: bool = False):
     model = load_model(model_name)
 
     # Observation from the perspective of the opponent
-    def saved_opponent_policy(seed: int, observation: np.array) -> int:
+    def saved_opponent_policy(rng: np.random.Generator, observation: np.array) -> int:
         nonlocal model
 
         # TODO: extract these using a more sensible shared interface
@@ -35,7 +44,7 @@ def get_saved_opponent_policy(model_name: str, deterministic: bool = False):
         assert action >= 0 and action <= 5, f"Action {action} was not in correct range"
 
         if opponent_side[action] == 0:
-            action = get_random_valid_move(opponent_side)
+            action = get_random_valid_move(opponent_side, rng)
 
         return int(action)
 
@@ -0,0 +1,254 @@
+from typing import Any, NamedTuple
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from gymnasium import spaces
+from stable_baselines3 import DQN
+from stable_baselines3.common.buffers import ReplayBuffer
+
+
+class SumTree:
+    """
+    A binary tree of priorities in one flat array, where each node is the sum of its children
+    and the leaves are the priorities of the items. Node 1 is the root (the total), node i has
+    children 2i and 2i + 1, and item i's leaf is node `n_leaves + i`.
+
+    Updates and sampling act on whole batches of items, a level of the tree at a time.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._n_leaves = 1 << max(capacity - 1, 1).bit_length()
+        self._depth = self._n_leaves.bit_length() - 1
+        self._tree = np.zeros(2 * self._n_leaves, dtype=np.float64)
+
+    @property
+    def total(self) -> float:
+        return float(self._tree[1])
+
+    def __getitem__(self, indices: np.array) -> np.array:
+        return self._tree[self._n_leaves + np.asarray(indices)]
+
+    def update(self, indices: np.array, priorities: np.array):
+        nodes = self._n_leaves + np.asarray(indices)
+        # Of repeated indices, the last priority is kept
+        self._tree[nodes] = priorities
+        for _ in range(self._depth):
+            # Parents shared by several items are summed more than once, which is cheaper than
+            # finding the distinct parents and gives the same result
+            nodes >>= 1
+            self._tree[nodes] = self._tree[2 * nodes] + self._tree[2 * nodes + 1]
+
+    def find(self, values: np.array) -> np.array:
+        """
+        Returns: For each value in [0, total), the item whose range of cumulative priority it
+        falls in
+        """
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.intp)
+        for _ in range(self._depth):
+            left = 2 * nodes
+            left_sums = self._tree[left]
+            go_right = values >= left_sums
+            values -= np.where(go_right, left_sums, 0.0)
+            nodes = left + go_right
+        return nodes - self._n_leaves
+
+
+class PrioritizedReplayBufferSamples(NamedTuple):
+    observations: torch.Tensor
+    actions: torch.Tensor
+    next_observations: torch.Tensor
+    dones: torch.Tensor
+    rewards: torch.Tensor
+    discounts: torch.Tensor | None
+    # Importance sampling weights, correcting for the bias of prioritized sampling
+    weights: torch.Tensor
+    # Of each sample in the buffer, to update its priority
+    indices: np.array
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """
+    Replay buffer sampling transitions in proportion to their priority to the power `alpha`,
+    where a transition's priority is its last absolute TD error. New transitions get the highest
+    priority seen so far, so they're all sampled at least once or so. This samples the rare
+    decisive transitions at the end of games far more often than uniform sampling.
+
+    Observations are stored as uint8, since pits and stores never hold more than 48 gems.
+    """
+
+    def __init__(
+        self,
+        buffer_size: int,
+        observation_space: spaces.Space,
+        action_space: spaces.Space,
+        device: torch.device | str = "auto",
+        n_envs: int = 1,
+        optimize_memory_usage: bool = False,
+        handle_timeout_termination: bool = True,
+        alpha: float = 0.6,
+        beta: float = 0.4,
+        epsilon: float = 1e-6,
+        seed: int | None = None,
+    ):
+        assert (
+            not optimize_memory_usage
+        ), "prioritized replay doesn't support optimize_memory_usage"
+        super().__init__(
+            buffer_size,
+            observation_space,
+            action_space,
+            device,
+            n_envs=n_envs,
+            optimize_memory_usage=False,
+            handle_timeout_termination=handle_timeout_termination,
+        )
+        assert np.all(
+            observation_space.nvec <= 256
+        ), "observations don't fit in uint8 storage"
+        self.observations = self.observations.astype(np.uint8)
+        self.next_observations = self.next_observations.astype(np.uint8)
+
+        self.alpha = alpha
+        # Importance sampling exponent, annealed towards 1 over training by PrioritizedDQN
+        self.beta = beta
+        self.epsilon = epsilon
+        self.max_priority = 1.0
+        # Item i is transition (i // n_envs, i % n_envs) of the buffer
+        self.priorities = SumTree(self.buffer_size * self.n_envs)
+        self._rng = np.random.default_rng(seed)
+
+    def add(
+        self,
+        obs: np.ndarray,
+        next_obs: np.ndarray,
+        action: np.ndarray,
+        reward: np.ndarray,
+        done: np.ndarray,
+        infos: list[dict[str, Any]],
+    ) -> None:
+        first_item = self.pos * self.n_envs
+        super().add(obs, next_obs, action, reward, done, infos)
+        self.priorities.update(
+            np.arange(first_item, first_item + self.n_envs),
+            np.full(self.n_envs, self.max_priority**self.alpha),
+        )
+
+    def sample(
+        self, batch_size: int, env: Any | None = None
+    ) -> PrioritizedReplayBufferSamples:
+        """
+        Stratified sampling: one sample from each of `batch_size` equal ranges of cumulative
+        priority, which spreads a batch across the buffer better than independent samples
+        """
+        total = self.priorities.total
+        bounds = np.arange(batch_size) * (total / batch_size)
+        n_items = self.size() * self.n_envs
+        # Items are added in order until the buffer is full, and rounding can otherwise land
+        # just past the last of them
+        items = np.minimum(
+            self.priorities.find(
+                bounds + self._rng.random(batch_size) * (total / batch_size)
+            ),
+            n_items - 1,
+        )
+
+        # (N * P(i)) ** -beta, normalised by the batch's largest weight so that weights only
+        # ever scale the loss down
+        weights = (n_items * self.priorities[items] / total) ** -self.beta
+        weights /= weights.max()
+
+        batch_inds, env_indices = np.divmod(items, self.n_envs)
+        data = (
+            self._normalize_obs(self.observations[batch_inds, env_indices, :], env),
+            self.actions[batch_inds, env_indices, :],
+            self._normalize_obs(
+                self.next_observations[batch_inds, env_indices, :], env
+            ),
+            # Only use dones that are not due to timeouts
+            (
+                self.dones[batch_inds, env_indices]
+                * (1 - self.timeouts[batch_inds, env_indices])
+            ).reshape(-1, 1),
+            self._normalize_reward(
+                self.rewards[batch_inds, env_indices].reshape(-1, 1), env
+            ),
+        )
+        return PrioritizedReplayBufferSamples(
+            *map(self.to_torch, data),
+            discounts=None,
+            weights=self.to_torch(weights.astype(np.float32).reshape(-1, 1)),
+            indices=items,
+        )
+
+    def update_priorities(self, indices: np.array, td_errors: np.array):
+        priorities = np.abs(td_errors) + self.epsilon
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.priorities.update(indices, priorities**self.alpha)
+
+
+class PrioritizedDQN(DQN):
+    """
+    DQN trained from a PrioritizedReplayBuffer: the Huber loss of each sample is weighted by its
+    importance sampling weight, and its priority is updated to its new TD error. The buffer's
+    beta is annealed linearly from its initial value to 1 over training.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, replay_buffer_class=PrioritizedReplayBuffer, **kwargs)
+
+    def _setup_model(self) -> None:
+        super()._setup_model()
+        self.initial_beta = self.replay_buffer.beta
+
+    def train(self, gradient_steps: int, batch_size: int = 100) -> None:
+        self.policy.set_training_mode(True)
+        self._update_learning_rate(self.policy.optimizer)
+        self.replay_buffer.beta = self.initial_beta + (1 - self.initial_beta) * (
+            1 - self._current_progress_remaining
+        )
+
+        losses = []
+        for _ in range(gradient_steps):
+            replay_data = self.replay_buffer.sample(
+                batch_size, env=self._vec_normalize_env
+            )
+
+            with torch.no_grad():
+                next_q_values = self.q_net_target(replay_data.next_observations)
+                next_q_values, _ = next_q_values.max(dim=1)
+                next_q_values = next_q_values.reshape(-1, 1)
+                target_q_values = (
+                    replay_data.rewards
+                    + (1 - replay_data.dones) * self.gamma * next_q_values
+                )
+
+            current_q_values = torch.gather(
+                self.q_net(replay_data.observations),
+                dim=1,
+                index=replay_data.actions.long(),
+            )
+
+            loss = (
+                replay_data.weights
+                * F.smooth_l1_loss(current_q_values, target_q_values, reduction="none")
+            ).mean()
+            losses.append(loss.item())
+
+            self.policy.optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(self.policy.parameters(), self.max_grad_norm)
+            self.policy.optimizer.step()
+
+            self.replay_buffer.update_priorities(
+                replay_data.indices,
+                (current_q_values - target_q_values).detach().cpu().numpy().flatten(),
+            )
+
+        self._n_updates += gradient_steps
+
+        self.logger.record("train/n_updates", self._n_updates, exclude="tensorboard")
+        self.logger.record("train/loss", np.mean(losses))
+        self.logger.record("train/per_beta", self.replay_buffer.beta)
@@ -0,0 +1,259 @@
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from pkg.mancala_agent_pkg.model.opponent_policy import get_random_valid_move
+from pkg.mancala_agent_pkg.model.load_model import get_model_path
+from pkg.mancala_agent_pkg.model.numpy_policy import (
+    FEATURE_OFFSETS,
+    QNetWeights,
+    best_valid_actions,
+    load_q_net_weights,
+    q_values,
+)
+
+# (weight, scale, bias) for each linear layer, with the weight quantized to int8 and shaped
+# (out_features, in_features) as in torch, so that weight * scale approximates the float weight
+QuantizedQNetWeights = list[tuple[np.ndarray, np.float32, np.ndarray]]
+
+# Saved alongside the float export as q_net_int8.npy (every weight flattened into one int8 array,
+# the first layer's transposed so the columns gathered for each pit are contiguous) and
+# q_net_int8.json (the layer shapes, scales, biases and exploration rate)
+QUANTIZED_EXPORT_NAME = "q_net_int8"
+
+
+def quantize_q_net_weights(weights: QNetWeights) -> QuantizedQNetWeights:
+    """
+    Symmetric int8 quantization of each layer's weights with one scale per layer. Biases stay
+    float32, since they're a tiny fraction of the weights.
+    """
+    quantized = []
+    for weight, bias in weights:
+        scale = np.float32(max(np.abs(weight).max(), 1e-12) / 127)
+        quantized.append(
+            (
+                np.clip(np.round(weight / scale), -127, 127).astype(np.int8),
+                scale,
+                bias.astype(np.float32),
+            )
+        )
+    return quantized
+
+
+def get_quantized_export_prefix(model_dir: str) -> str:
+    return os.path.join(model_dir, QUANTIZED_EXPORT_NAME)
+
+
+def is_quantized_exported(model_dir: str) -> bool:
+    return os.path.isfile(f"{get_quantized_export_prefix(model_dir)}.json")
+
+
+def save_quantized_q_net_weights(
+    quantized: QuantizedQNetWeights, exploration_rate: float, model_dir: str
+):
+    prefix = get_quantized_export_prefix(model_dir)
+    first_weight = quantized[0][0]
+    np.save(
+        f"{prefix}.npy",
+        np.concatenate(
+            [first_weight.T.ravel()]
+            + [weight.ravel() for weight, _, _ in quantized[1:]]
+        ),
+    )
+
+    with open(f"{prefix}.json", "w") as f:
+        json.dump(
+            {
+                "shapes": [list(weight.shape) for weight, _, _ in quantized],
+                "scales": [float(scale) for _, scale, _ in quantized],
+                "biases": [bias.tolist() for _, _, bias in quantized],
+                "exploration_rate": exploration_rate,
+            },
+            f,
+        )
+
+
+def load_quantized_q_net_weights(
+    model_dir: str, mmap: bool = False
+) -> tuple[QuantizedQNetWeights, float]:
+    """
+    The first layer stays int8, optionally memory-mapped read-only so processes serving the same
+    model share it. It's most of the weights, and only the rows for an observation's pits are
+    ever read from it. NumPy has no int8 matrix multiply, so the weights of the dense layers are
+    converted to (integer valued) float32 once here rather than on every forward pass.
+
+    Returns: The quantized Q-network weights and the exploration rate the model was saved with
+    """
+    prefix = get_quantized_export_prefix(model_dir)
+    with open(f"{prefix}.json") as f:
+        metadata = json.load(f)
+    flat = np.load(f"{prefix}.npy", mmap_mode="r" if mmap else None)
+
+    quantized, offset = [], 0
+    for i, (shape, scale, bias) in enumerate(
+        zip(metadata["shapes"], metadata["scales"], metadata["biases"])
+    ):
+        size = int(np.prod(shape))
+        if i == 0:
+            # A plain view of the mapping, since np.memmap adds overhead to every small operation
+            weight = np.asarray(flat[offset : offset + size]).reshape(shape[::-1]).T
+        else:
+            weight = flat[offset : offset + size].reshape(shape).astype(np.float32)
+        offset += size
+        quantized.append(
+            (
+                weight,
+                np.float32(scale),
+                np.array(bias, dtype=np.float32),
+            )
+        )
+
+    return quantized, metadata["exploration_rate"]
+
+
+def quantized_q_values(
+    quantized: QuantizedQNetWeights, observations: np.array
+) -> np.array:
+    """
+    Batched forward pass of the quantized Q-network.
+
+    Returns: An (n, 6) array of Q-values for an (n, 14) array of observations
+    """
+    observations = np.atleast_2d(observations)
+
+    # The input is one-hot, so the first layer is an exact int32 sum of the int8 weight columns
+    # of each pit's feature, scaled once at the end
+    weight, scale, bias = quantized[0]
+    hidden = np.add.reduce(
+        weight.T[observations.astype(np.intp) + FEATURE_OFFSETS],
+        axis=1,
+        dtype=np.int32,
+    ).astype(np.float32)
+    hidden *= scale
+    hidden += bias
+
+    for weight, scale, bias in quantized[1:]:
+        np.maximum(hidden, 0.0, out=hidden)
+        hidden = (hidden @ weight.T.astype(np.float32, copy=False)) * scale + bias
+
+    return hidden
+
+
+def get_quantized_opponent_policy(
+    quantized: QuantizedQNetWeights, exploration_rate: float = 0.0
+):
+    """
+    Opponent policy equivalent to get_numpy_opponent_policy, but using the quantized weights
+    """
+
+    # Observation from the perspective of the opponent
+    def quantized_opponent_policy(
+        rng: np.random.Generator, observation: np.array
+    ) -> int:
+        opponent_side = observation[:6]
+        assert sum(opponent_side) > 0, "Opponent has no valid moves"
+
+        if exploration_rate > 0 and rng.random() < exploration_rate:
+            return get_random_valid_move(opponent_side, rng)
+
+        values = quantized_q_values(quantized, observation)
+        return int(best_valid_actions(values, observation)[0])
+
+    return quantized_opponent_policy
+
+
+def sample_positions(n_positions: int, rng: np.random.Generator) -> np.array:
+    """
+    Returns: An (n, 14) array of positions with the player to move, from games of random moves
+    """
+    # Imported here so that serving the quantized model doesn't import the env
+    import gymnasium as gym
+
+    import mancala_env  # noqa: F401 is used
+    from pkg.mancala_agent_pkg.model.opponent_policy import random_opponent_policy
+
+    env = gym.make(
+        "Mancala-v0", max_episode_steps=100, opponent_policy=random_opponent_policy
+    )
+    obs, _ = env.reset(seed=int(rng.integers(2**32)))
+    positions = []
+    while len(positions) < n_positions:
+        positions.append(obs)
+        obs, _, terminated, truncated, _ = env.step(get_random_valid_move(obs[:6], rng))
+        if terminated or truncated:
+            obs, _ = env.reset()
+    return np.array(positions)
+
+
+def get_action_agreement(
+    weights: QNetWeights, quantized: QuantizedQNetWeights, observations: np.array
+) -> float:
+    """
+    Returns: The fraction of observations where the quantized and float Q-networks pick the
+    same valid action
+    """
+    return float(
+        (
+            best_valid_actions(q_values(weights, observations), observations)
+            == best_valid_actions(
+                quantized_q_values(quantized, observations), observations
+            )
+        ).mean()
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--model", type=str, default="prod", help="Name of the saved model to quantize"
+    )
+    parser.add_argument(
+        "--n-positions",
+        type=int,
+        default=100_000,
+        help="Positions from random games to compare the quantized and float models on",
+    )
+    parser.add_argument(
+        "--min-agreement",
+        type=float,
+        default=0.99,
+        help="Fraction of positions the models must pick the same move in, for the quantized "
+        "weights to be saved",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    model_dir = get_model_path(args.model)
+    weights, exploration_rate = load_q_net_weights(model_dir)
+    quantized = quantize_q_net_weights(weights)
+
+    positions = sample_positions(args.n_positions, np.random.default_rng(args.seed))
+    agreement = get_action_agreement(weights, quantized, positions)
+    print(f"action agreement over {len(positions)} positions: {agreement:.4%}")
+
+    if agreement < args.min_agreement:
+        print(f"not saving, agreement is below {args.min_agreement:.2%}")
+        sys.exit(1)
+
+    # Imported here, since the store imports this module for the name of the export
+    from pkg.mancala_agent_pkg.model import artifacts
+
+    if artifacts.resolve(args.model) is None:
+        save_quantized_q_net_weights(quantized, exploration_rate, model_dir)
+        print(f"saved quantized weights to '{get_quantized_export_prefix(model_dir)}'")
+        return
+
+    # Stored models can't be changed, so the tag is moved to a copy with the weights added
+    with artifacts.update_tag(args.model) as scratch_dir:
+        save_quantized_q_net_weights(quantized, exploration_rate, scratch_dir)
+    print(
+        f"saved quantized weights to '{args.model}', "
+        f"now artifact '{artifacts.resolve(args.model)}'"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,10 @@ import matplotlib.pyplot as plt
 import logging
 from functools import lru_cache
 
+from pkg.mancala_agent_pkg.model import artifacts
+from pkg.mancala_agent_pkg.model.load_model import get_model_path
+from pkg.mancala_agent_pkg.model.numpy_policy import export_saved_model
+
 logger = logging.getLogger(__name__)
 
 matplotlib.use("Agg")
@@ -60,23 +64,37 @@ def generate_plots(new_run: bool):
         plt.savefig(f"{last_run_path}/plots.png")
 
 
+def export_weights(new_run: bool):
+    last_run_path = get_last_run_path(new_run)
+
+    if not os.path.isfile(f"{last_run_path}/best_model.zip"):
+        logger.warning(
+            f"No best model found to export for the last run at '{last_run_path}'"
+        )
+        return
+
+    export_saved_model(last_run_path)
+
+
 def save_files(new_run: bool):
+    """
+    Publish the last run's files to the model store, tagged with the current time
+    """
     last_run_path = get_last_run_path(new_run)
     now = f"{datetime.now():%Y-%m-%d_%H-%M-%S}"
-    mkdir_r_p(f"./saved_models/{now}/")
-    for file in os.listdir(last_run_path):
-        filename = os.path.basename(file)
-        shutil.copy(
-            f"{last_run_path}/{filename}",
-            f"./saved_models/{now}/{filename}",
-        )
+    artifact = artifacts.publish(last_run_path)
+    artifacts.tag(now, artifact)
+    logger.info(f"saved run as artifact '{artifact}', tagged '{now}'")
+    print(f"saved run as '{get_model_path(now)}' (artifact {artifact[:16]})")
 
 
 def save_run():
     generate_plots(new_run=True)
+    export_weights(new_run=True)
     save_files(new_run=True)
 
 
 if __name__ == "__main__":
     generate_plots(new_run=False)
+    export_weights(new_run=False)
     save_files(new_run=False)
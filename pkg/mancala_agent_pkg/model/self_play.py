@@ -0,0 +1,105 @@
+import logging
+from collections import deque
+
+import numpy as np
+import gymnasium as gym
+from stable_baselines3.common.callbacks import BaseCallback
+
+import pkg.mancala_agent_pkg.model.opponent_policy as op
+from pkg.mancala_agent_pkg.model.numpy_policy import (
+    QNetWeights,
+    get_q_net_weights,
+    q_values,
+    best_valid_actions,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class OpponentPool:
+    """
+    A rolling pool of in-memory snapshots of the learner, used as self-play opponents.
+    Until the first snapshot is taken, opponents play random valid moves.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 5,
+        latest_probability: float = 0.5,
+        rng: np.random.Generator | None = None,
+    ):
+        self._snapshots: deque[QNetWeights] = deque(maxlen=max_size)
+        # Chance of facing the most recent snapshot, rather than one sampled uniformly from the pool
+        self._latest_probability = latest_probability
+        self._current: QNetWeights | None = None
+        # Used to sample opponents, and for random moves if no generator is passed in
+        self._rng = rng if rng is not None else np.random.default_rng()
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+    def add_snapshot(self, model):
+        self._snapshots.append(get_q_net_weights(model))
+        logger.info(f"added snapshot to opponent pool, pool size: '{len(self)}'")
+
+    def sample_opponent(self):
+        if not self._snapshots:
+            self._current = None
+            return
+
+        if self._rng.random() < self._latest_probability:
+            self._current = self._snapshots[-1]
+        else:
+            self._current = self._snapshots[self._rng.integers(len(self._snapshots))]
+
+    def predict_batch(
+        self, observations: np.array, rng: np.random.Generator | None = None
+    ) -> np.array:
+        """
+        Returns: The current opponent's action for each of an (n, 14) array of observations,
+        all from the perspective of the opponent
+        """
+        observations = np.atleast_2d(observations)
+        if self._current is None:
+            return op.get_random_valid_moves(
+                observations[:, :6], rng if rng is not None else self._rng
+            )
+
+        return best_valid_actions(q_values(self._current, observations), observations)
+
+    # Observation from the perspective of the opponent
+    def opponent_policy(self, rng: np.random.Generator, observation: np.array) -> int:
+        assert sum(observation[:6]) > 0, "Opponent has no valid moves"
+        return int(self.predict_batch(observation, rng)[0])
+
+
+class SelfPlayOpponentWrapper(gym.Wrapper):
+    """
+    Samples a new opponent from the pool at the start of every episode. The wrapped env must have
+    been created with `opponent_policy=pool.opponent_policy`.
+    """
+
+    def __init__(self, env: gym.Env, pool: OpponentPool):
+        super().__init__(env)
+        self._pool = pool
+
+    def reset(self, **kwargs):
+        # Sample before resetting, since the opponent may take the first turn during reset
+        self._pool.sample_opponent()
+        return self.env.reset(**kwargs)
+
+
+class SelfPlaySnapshotCallback(BaseCallback):
+    """
+    Snapshots the learner into the opponent pool every `snapshot_freq` steps.
+    """
+
+    def __init__(self, pool: OpponentPool, snapshot_freq: int, verbose: int = 0):
+        super().__init__(verbose)
+        self._pool = pool
+        self._snapshot_freq = snapshot_freq
+
+    def _on_step(self) -> bool:
+        if self.n_calls % self._snapshot_freq == 0:
+            self._pool.add_snapshot(self.model)
+        return True
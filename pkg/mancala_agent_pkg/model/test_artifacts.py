@@ -0,0 +1,139 @@
+import os
+
+import pytest
+
+from pkg.mancala_agent_pkg.model import artifacts
+
+
+def write_model(path, files: dict[str, str]) -> str:
+    os.makedirs(path, exist_ok=True)
+    for name, contents in files.items():
+        with open(os.path.join(path, name), "w") as f:
+            f.write(contents)
+    return str(path)
+
+
+def list_blobs(root) -> list[str]:
+    return sorted(os.listdir(os.path.join(artifacts.get_store_path(root), "blobs")))
+
+
+def read_file(root, name: str, file_name: str) -> str:
+    with open(os.path.join(root, name, file_name)) as f:
+        return f.read()
+
+
+def test_publish_stores_identical_files_once(tmp_path):
+    root = str(tmp_path / "saved_models")
+    first = write_model(tmp_path / "a", {"best_model.zip": "model", "notes": "a"})
+    second = write_model(tmp_path / "b", {"best_model.zip": "model", "notes": "b"})
+
+    artifact = artifacts.publish(first, root=root)
+    assert artifacts.publish(first, root=root) == artifact
+    other = artifacts.publish(second, root=root)
+    assert other != artifact
+
+    # Three distinct files, with the model shared by both artifacts
+    assert len(list_blobs(root)) == 3
+    model_path = os.path.join(
+        artifacts.get_artifact_path(artifact, root), "best_model.zip"
+    )
+    assert os.stat(model_path).st_nlink == 3
+
+    manifest = artifacts.read_manifest(artifact, root)
+    assert set(manifest["files"]) == {"best_model.zip", "notes"}
+    assert manifest["exports"] == {}
+
+
+def test_tag_and_untag(tmp_path):
+    root = str(tmp_path / "saved_models")
+    first = artifacts.publish(write_model(tmp_path / "a", {"f": "1"}), root=root)
+    second = artifacts.publish(write_model(tmp_path / "b", {"f": "2"}), root=root)
+
+    artifacts.tag("prod", first, root)
+    assert artifacts.resolve("prod", root) == first
+    assert read_file(root, "prod", "f") == "1"
+
+    artifacts.tag("prod", second, root)
+    artifacts.tag("opponent", first, root)
+    assert artifacts.list_tags(root) == {"opponent": first, "prod": second}
+    assert read_file(root, "prod", "f") == "2"
+
+    artifacts.untag("opponent", root)
+    assert artifacts.list_tags(root) == {"prod": second}
+    assert os.path.isdir(artifacts.get_artifact_path(first, root))
+
+    with pytest.raises(AssertionError):
+        artifacts.tag("prod", "0" * 64, root)
+
+
+def test_adopt_replaces_directory_with_tag(tmp_path):
+    root = str(tmp_path / "saved_models")
+    write_model(os.path.join(root, "prod"), {"best_model.zip": "model"})
+    # A tag can't replace a plain directory
+    with pytest.raises(AssertionError, match="adopt it into the store first"):
+        artifacts.tag(
+            "prod", artifacts.publish(os.path.join(root, "prod"), root=root), root
+        )
+
+    artifact = artifacts.adopt("prod", root)
+    assert artifacts.resolve("prod", root) == artifact
+    assert read_file(root, "prod", "best_model.zip") == "model"
+    (adopted,) = os.listdir(os.path.join(artifacts.get_store_path(root), "adopted"))
+    assert adopted.startswith("prod-")
+
+
+def test_update_tag_leaves_the_old_artifact_unchanged(tmp_path):
+    root = str(tmp_path / "saved_models")
+    base = artifacts.publish(
+        write_model(tmp_path / "a", {"best_model.zip": "model", "q_net.npy": "old"}),
+        root=root,
+    )
+    artifacts.tag("prod", base, root)
+
+    with artifacts.update_tag("prod", root) as scratch_dir:
+        write_model(scratch_dir, {"q_net.npy": "new", "q_net.json": "{}"})
+
+    updated = artifacts.resolve("prod", root)
+    assert updated != base
+    assert read_file(root, "prod", "best_model.zip") == "model"
+    assert read_file(root, "prod", "q_net.npy") == "new"
+    assert artifacts.read_manifest(updated, root)["exports"] == {"numpy": "q_net"}
+    with open(os.path.join(artifacts.get_artifact_path(base, root), "q_net.npy")) as f:
+        assert f.read() == "old"
+
+
+def test_collect_garbage_keeps_what_tags_refer_to(tmp_path):
+    root = str(tmp_path / "saved_models")
+    kept = artifacts.publish(
+        write_model(tmp_path / "a", {"shared": "x", "kept": "1"}), root=root
+    )
+    dropped = artifacts.publish(
+        write_model(tmp_path / "b", {"shared": "x", "dropped": "2"}), root=root
+    )
+    artifacts.tag("prod", kept, root)
+
+    assert artifacts.collect_garbage(root) == (1, 1)
+    assert not os.path.exists(artifacts.get_artifact_path(dropped, root))
+    assert read_file(root, "prod", "shared") == "x"
+    assert read_file(root, "prod", "kept") == "1"
+    assert len(list_blobs(root)) == 2
+    assert artifacts.collect_garbage(root) == (0, 0)
+
+
+def test_refuses_blobs_changed_in_place(tmp_path):
+    root = str(tmp_path / "saved_models")
+    source = write_model(tmp_path / "a", {"best_model.zip": "model"})
+    artifacts.tag("prod", artifacts.publish(source, root=root), root)
+
+    # As writing through a tag would, e.g. as root
+    (blob,) = list_blobs(root)
+    blob_path = os.path.join(artifacts.get_store_path(root), "blobs", blob)
+    os.chmod(blob_path, 0o644)
+    with open(blob_path, "w") as f:
+        f.write("corrupted")
+
+    with pytest.raises(AssertionError, match="no longer matches its hash"):
+        artifacts.publish(source, root=root)
+    with pytest.raises(AssertionError, match="no longer matches its hash"):
+        with artifacts.update_tag("prod", root) as scratch_dir:
+            write_model(scratch_dir, {"q_net.json": "{}"})
@@ -0,0 +1,115 @@
+import io
+import json
+
+import numpy as np
+import pytest
+from mancala_env.envs import kernel
+from mancala_env.envs.game_record import GameRecordWriter
+
+from pkg.mancala_agent_pkg.model.evaluate_positions import evaluate_file, search_values
+
+START_BOARD = np.array([4] * 6 + [0] + [4] * 6 + [0])
+
+
+def play_random_games(n_games: int, seed: int = 0) -> list[np.ndarray]:
+    """
+    Returns: For each game, its boards from the first player's perspective, and whether it was
+    the second player to move in each
+    """
+    rng = np.random.default_rng(seed)
+    games = []
+    for _ in range(n_games):
+        board, second_to_move = START_BOARD.copy(), False
+        boards, movers = [], []
+        while True:
+            boards.append(kernel.flip(board) if second_to_move else board.copy())
+            movers.append(second_to_move)
+            if kernel.is_terminal(board):
+                break
+            action = rng.choice(np.flatnonzero(kernel.legal_moves(board)))
+            if not kernel.apply_move(board, action):
+                board, second_to_move = kernel.flip(board), not second_to_move
+        games.append((np.array(boards), np.array(movers)))
+    return games
+
+
+def naive_negamax(board: np.ndarray, depth: int) -> float:
+    value = float(board[kernel.STORE] - board[-1])
+    if depth == 0 or kernel.is_terminal(board):
+        return value
+    return max(
+        naive_move_value(board, action, depth) for action in range(6) if board[action]
+    )
+
+
+def naive_move_value(board: np.ndarray, action: int, depth: int) -> float:
+    child = board.copy()
+    if kernel.apply_move(child, action):
+        return naive_negamax(child, depth - 1)
+    return -naive_negamax(kernel.flip(child), depth - 1)
+
+
+@pytest.mark.parametrize("depth", [1, 3])
+def test_search_matches_naive_search(depth):
+    boards = np.concatenate(
+        [
+            np.where(movers[:, None], kernel.flip(game), game)
+            for game, movers in play_random_games(3)
+        ]
+    )
+    # A small frontier, so the search is split into slices
+    values = search_values(boards, depth, max_frontier=50)
+
+    for board, board_values in zip(boards, values):
+        for action in range(6):
+            if kernel.is_terminal(board) or board[action] == 0:
+                assert np.isnan(board_values[action])
+            else:
+                assert board_values[action] == naive_move_value(board, action, depth)
+
+
+def write_inputs(tmp_path) -> tuple[str, str]:
+    games = play_random_games(20)
+    # Games cut short on the opponent's turn, which only the final row says is theirs
+    games += [
+        (boards[: stop + 1], movers[: stop + 1])
+        for boards, movers in games[:5]
+        for stop in np.flatnonzero(movers)[:1]
+    ]
+    record_path = str(tmp_path / "games.bin")
+    jsonl_path = str(tmp_path / "positions.jsonl")
+    with GameRecordWriter(record_path) as writer, open(jsonl_path, "w") as f:
+        for boards, movers in games:
+            writer.write_game(
+                boards,
+                np.zeros(len(boards) - 1, dtype=int),
+                movers[:-1],
+                opponent_to_move=movers[-1],
+            )
+            for board, mover in zip(boards.tolist(), movers.tolist()):
+                state = {
+                    "player_side": board[:6],
+                    "player_score": board[6],
+                    "opponent_side": board[7:13],
+                    "opponent_score": board[13],
+                    "opponent_to_start": mover,
+                }
+                f.write(f"{json.dumps(state)}\n")
+    return record_path, jsonl_path
+
+
+def evaluate(path: str, **kwargs) -> str:
+    output = io.StringIO()
+    evaluate_file(path, output, "search", depth=2, **kwargs)
+    return output.getvalue()
+
+
+def test_workers_give_the_same_output_in_order(tmp_path):
+    record_path, jsonl_path = write_inputs(tmp_path)
+    expected = evaluate(record_path)
+    indices = [json.loads(line)["index"] for line in expected.splitlines()]
+    assert indices == list(range(len(indices)))
+
+    assert evaluate(record_path, chunk_size=7, n_workers=2, max_in_flight=3) == expected
+    # The same positions, with whoever is to move given by the record's moves instead
+    assert evaluate(jsonl_path, chunk_size=7, n_workers=2) == expected
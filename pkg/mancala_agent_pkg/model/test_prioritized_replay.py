@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from gymnasium import spaces
+
+from pkg.mancala_agent_pkg.model.prioritized_replay import (
+    PrioritizedReplayBuffer,
+    SumTree,
+)
+
+
+@pytest.mark.parametrize("capacity", [1, 5, 7, 8, 1000])
+def test_find_matches_prefix_sums(capacity):
+    rng = np.random.default_rng(capacity)
+    priorities = rng.random(capacity) + 0.01
+    tree = SumTree(capacity)
+    tree.update(np.arange(capacity), priorities)
+    assert tree.total == pytest.approx(priorities.sum())
+
+    values = rng.random(10_000) * tree.total
+    expected = np.searchsorted(np.cumsum(priorities), values, side="right")
+    assert np.array_equal(tree.find(values), expected)
+
+
+def test_update_keeps_last_of_repeated_indices():
+    tree = SumTree(5)
+    tree.update(np.arange(5), np.ones(5))
+    tree.update(np.array([2, 2, 4, 2]), np.array([3.0, 5.0, 2.0, 7.0]))
+
+    assert tree[np.arange(5)].tolist() == [1.0, 1.0, 7.0, 1.0, 2.0]
+    assert tree.total == pytest.approx(12.0)
+    # Items after the updated ones move along with the new cumulative priorities
+    assert tree.find([2.5, 9.5, 10.5]).tolist() == [2, 3, 4]
+
+
+def make_buffer(priorities: np.ndarray, alpha: float, beta: float):
+    buffer = PrioritizedReplayBuffer(
+        len(priorities) + 3,
+        spaces.MultiDiscrete([49] * 14),
+        spaces.Discrete(6),
+        device="cpu",
+        alpha=alpha,
+        beta=beta,
+        seed=0,
+    )
+    for i in range(len(priorities)):
+        obs = np.full((1, 14), i % 49)
+        buffer.add(obs, obs, np.array([0]), np.array([0.0]), np.array([False]), [{}])
+    buffer.update_priorities(np.arange(len(priorities)), priorities - buffer.epsilon)
+    return buffer
+
+
+def test_samples_in_proportion_to_priority():
+    priorities = np.array([1.0, 2.0, 4.0, 8.0, 16.0])
+    buffer = make_buffer(priorities, alpha=0.5, beta=0.4)
+
+    counts = np.zeros(len(priorities))
+    for _ in range(2_000):
+        np.add.at(counts, buffer.sample(64).indices, 1)
+
+    expected = priorities**0.5 / (priorities**0.5).sum()
+    assert np.allclose(counts / counts.sum(), expected, atol=0.01)
+    # The buffer has room for more, and only items that were added are sampled
+    assert counts.sum() == 2_000 * 64
+
+
+def test_importance_sampling_weights():
+    priorities = np.array([1.0, 3.0, 9.0])
+    buffer = make_buffer(priorities, alpha=1.0, beta=0.5)
+    samples = buffer.sample(32)
+
+    probabilities = priorities / priorities.sum()
+    expected = (3 * probabilities[samples.indices]) ** -0.5
+    expected /= expected.max()
+    assert np.allclose(samples.weights.numpy().flatten(), expected, rtol=1e-5)
+    # Samples drawn more often are weighted down, and the largest weight is 1
+    assert samples.weights.max().item() == pytest.approx(1.0)
+    assert np.array_equal(
+        samples.observations.numpy()[:, 0], samples.indices.astype(np.float32)
+    )
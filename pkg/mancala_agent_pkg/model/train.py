@@ -1,27 +1,98 @@
+import argparse
 import logging
+import os
+from contextlib import nullcontext
 import gymnasium as gym
+import numpy as np
 
-import mancala_env
+import mancala_env  # noqa: F401 is used
+from mancala_env.envs import env_logging
+from mancala_env.envs.game_record import GameRecordWriter
 from stable_baselines3 import DQN
 from stable_baselines3.common.env_checker import check_env
 from stable_baselines3.common.callbacks import EvalCallback
 from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env import DummyVecEnv
 
 import pkg.mancala_agent_pkg.model.opponent_policy as op
 import pkg.mancala_agent_pkg.model.save as save
+from pkg.mancala_agent_pkg.profiling import profile_to
+from pkg.mancala_agent_pkg.model.prioritized_replay import PrioritizedDQN
+from pkg.mancala_agent_pkg.model.self_play import (
+    OpponentPool,
+    SelfPlayOpponentWrapper,
+    SelfPlaySnapshotCallback,
+)
 
-mancala_env_logger = logging.getLogger("mancala_env.envs.env_logging")
-mancala_env_logger.setLevel(logging.DEBUG)
-formatter = logging.Formatter(
-    "%(asctime)s [%(processName)s: %(process)d] "
-    "[%(threadName)s: %(thread)d] [%(levelname)s] "
-    f"[%(name)s] [{mancala_env.get_game_information_message_format()}]: "
-    "%(message)s"
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "--self-play",
+    action="store_true",
+    default=False,
+    help="Train against a rolling pool of past snapshots of the learner",
+)
+parser.add_argument(
+    "--snapshot-freq",
+    type=int,
+    default=10_000,
+    help="Steps between snapshots of the learner into the self-play opponent pool",
+)
+parser.add_argument(
+    "--pool-size",
+    type=int,
+    default=5,
+    help="Maximum number of past snapshots kept in the self-play opponent pool",
+)
+parser.add_argument(
+    "--profile-steps",
+    type=int,
+    default=0,
+    help="If set, profile this many env steps before training, then profile the learn loop. "
+    "Profiles are written to the last run directory",
+)
+parser.add_argument(
+    "--log-sample-rate",
+    type=float,
+    default=0.05,
+    help="Fraction of games to write env logs for",
 )
+parser.add_argument(
+    "--record-games",
+    type=str,
+    default=None,
+    help="Game record file to append every training game to",
+)
+parser.add_argument(
+    "--seed",
+    type=int,
+    default=None,
+    help="Seed for the whole run, a random one is picked and logged if not given",
+)
+parser.add_argument(
+    "--prioritized-replay",
+    action="store_true",
+    default=False,
+    help="Sample transitions in proportion to their TD error rather than uniformly",
+)
+args = parser.parse_known_args()[0]
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.StreamHandler())
+
 file_handler = logging.FileHandler(f"./{save.get_last_run_path()}/env.log")
-file_handler.setFormatter(formatter)
-mancala_env_logger.addHandler(file_handler)
+file_handler.setFormatter(env_logging.JsonLinesFormatter())
+env_logging.start_queue_logging(
+    file_handler, level=logging.DEBUG, sample_rate=args.log_sample_rate
+)
+
 
+# Every source of randomness gets its own stream, spawned from the run's seed
+seed_sequence = np.random.SeedSequence(args.seed)
+logger.info(f"run seed: {seed_sequence.entropy}")
+model_seed, env_seed, eval_seed, pool_seed, replay_seed = [
+    int(seed.generate_state(1)[0]) for seed in seed_sequence.spawn(5)
+]
 
 OPPONENT_MODEL_NAME = "opponent"
 
@@ -30,21 +101,58 @@ OPPONENT_MODEL_NAME = "opponent"
 opponent_policy = op.random_opponent_policy
 
 
-env = gym.make(
-    "Mancala-v0",
-    max_episode_steps=100,
-    opponent_policy=opponent_policy,
-)
-check_env(env)
-
-
-eval_env = Monitor(
-    gym.make(
+callbacks = []
+
+if args.self_play:
+    opponent_pool = OpponentPool(
+        max_size=args.pool_size, rng=np.random.default_rng(pool_seed)
+    )
+    env = SelfPlayOpponentWrapper(
+        gym.make(
+            "Mancala-v0",
+            max_episode_steps=100,
+            opponent_policy=opponent_pool.opponent_policy,
+        ),
+        opponent_pool,
+    )
+    callbacks.append(SelfPlaySnapshotCallback(opponent_pool, args.snapshot_freq))
+else:
+    env = gym.make(
         "Mancala-v0",
         max_episode_steps=100,
         opponent_policy=opponent_policy,
-    ),
+    )
+check_env(env)
+
+game_record_writer = None
+if args.record_games:
+    game_record_writer = GameRecordWriter(args.record_games)
+    env.unwrapped.record_games_to(game_record_writer)
+
+if args.profile_steps:
+    with profile_to(os.path.join(save.get_last_run_path(), "profile_env_steps")):
+        obs, _ = env.reset()
+        for _ in range(args.profile_steps):
+            obs, _, terminated, truncated, _ = env.step(
+                op.get_random_valid_move(obs[:6], env.unwrapped.np_random)
+            )
+            if terminated or truncated:
+                obs, _ = env.reset()
+
+
+eval_env = DummyVecEnv(
+    [
+        lambda: Monitor(
+            gym.make(
+                "Mancala-v0",
+                max_episode_steps=100,
+                opponent_policy=opponent_policy,
+            ),
+        )
+    ]
 )
+# Applied at the first evaluation's reset, which the rest of evaluation continues from
+eval_env.seed(eval_seed)
 
 
 eval_callback = EvalCallback(
@@ -56,14 +164,17 @@ eval_callback = EvalCallback(
     deterministic=True,
     render=False,
 )
+callbacks.append(eval_callback)
 
 policy_kwargs = dict(net_arch=[256, 256])
 
 # model = infer.load_model("train_from")
-model = DQN(
+model = (PrioritizedDQN if args.prioritized_replay else DQN)(
     "MlpPolicy",
     env,
     verbose=1,
+    seed=model_seed,
+    replay_buffer_kwargs=dict(seed=replay_seed) if args.prioritized_replay else None,
     #     learning_rate=0.0017660683439426617,
     #     batch_size=100,
     #     buffer_size=10000,
@@ -76,12 +187,22 @@ model = DQN(
     #     policy_kwargs=policy_kwargs,
 )
 model.set_env(env, force_reset=True)
-model.learn(
-    total_timesteps=50_000,
-    log_interval=4,
-    callback=eval_callback,
-)
-
+# Seeds are passed to vectorised envs at their next reset, which for the training env is at the
+# start of learn. Set after the model's own seeding, which would seed it from model_seed.
+model.env.seed(env_seed)
+with (
+    profile_to(os.path.join(save.get_last_run_path(), "profile_learn"))
+    if args.profile_steps
+    else nullcontext()
+):
+    model.learn(
+        total_timesteps=50_000,
+        log_interval=4,
+        callback=callbacks,
+    )
+
+if game_record_writer is not None:
+    game_record_writer.close()
 
 # Assumes that an EvalCallback has been used
 save.save_run()
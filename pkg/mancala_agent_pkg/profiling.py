@@ -0,0 +1,68 @@
+import cProfile
+import os
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+
+class StackSampler:
+    """
+    Periodically samples the call stack of a thread, aggregating the samples into the collapsed
+    stack format read by flamegraph tools (e.g. flamegraph.pl, speedscope, inferno).
+    """
+
+    def __init__(self, thread_id: int | None = None, interval: float = 0.001):
+        self._thread_id = thread_id or threading.get_ident()
+        self._interval = interval
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> "StackSampler":
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *_):
+        self._stop.set()
+        self._sampler.join()
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                self._stacks[self._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(
+                f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            )
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def write_collapsed(self, path: str):
+        with open(path, "w") as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def profile_to(path_prefix: str):
+    """
+    Profiles the enclosed block on the current thread, writing deterministic cProfile stats to
+    `<path_prefix>.prof` and sampled stacks to `<path_prefix>.collapsed`.
+    """
+    profiler = cProfile.Profile()
+    with StackSampler() as sampler:
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+
+    profiler.dump_stats(f"{path_prefix}.prof")
+    sampler.write_collapsed(f"{path_prefix}.collapsed")
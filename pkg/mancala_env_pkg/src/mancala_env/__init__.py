@@ -6,7 +6,7 @@ from mancala_env.envs.env_logging import get_game_information_message_format
 
 # TODO: find a way to force clients to supply an opponent_policy without befouling
 # the env checker
-def placeholder_policy(seed: Any, _: Any):
+def placeholder_policy(rng: Any, _: Any):
     return -1
 
 
@@ -1,2 +1,3 @@
 from mancala_env.envs.mancala import MancalaEnv
 from mancala_env.envs.env_logging import get_game_information_message_format
+from mancala_env.envs.game_record import GameRecordWriter, GameRecordReader
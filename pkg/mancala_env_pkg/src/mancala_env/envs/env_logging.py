@@ -1,10 +1,22 @@
+import atexit
+import copy
+import itertools
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
 
 env_logger = logging.getLogger(__name__)
 # setting warning level by default, in accordance with the advice on library logging
 # see https://docs.python.org/3/howto/logging.html#configuring-logging-for-a-library (2025-03-02)
 env_logger.setLevel(logging.WARNING)
 
+# Fraction of games whose logs are kept, decided once per game so sampled games are complete
+_game_sample_rate = 1.0
+_game_counter = itertools.count()
+
 
 def get_game_information_message_format() -> str:
     """
@@ -13,5 +25,137 @@ def get_game_information_message_format() -> str:
     return "Game ID:%(game_id)s"
 
 
+class GameLoggerAdapter(logging.LoggerAdapter):
+    """
+    Adds the game id to every record, while keeping any `extra` passed with the call (which the
+    base LoggerAdapter discards), e.g. `extra={"event": "game_finished", "data": {...}}`.
+    """
+
+    def process(self, msg, kwargs):
+        kwargs["extra"] = {**self.extra, **kwargs.get("extra", {})}
+        return msg, kwargs
+
+
+class UnsampledGameLogger(GameLoggerAdapter):
+    """
+    Logger for games that weren't sampled, which only passes on warnings and errors
+    """
+
+    def isEnabledFor(self, level: int) -> bool:
+        return level >= logging.WARNING and super().isEnabledFor(level)
+
+    def log(self, level, msg, *args, **kwargs):
+        if level >= logging.WARNING:
+            super().log(level, msg, *args, **kwargs)
+
+
+def new_game_id() -> str:
+    # Unique per process without the cost of uuid4, and the pid keeps ids from forked or
+    # parallel workers apart
+    return f"{os.getpid():x}-{next(_game_counter):x}"
+
+
+def set_game_sample_rate(sample_rate: float):
+    global _game_sample_rate
+    assert 0.0 <= sample_rate <= 1.0, f"sample rate '{sample_rate}' must be in [0, 1]"
+    _game_sample_rate = sample_rate
+
+
+def get_game_logger() -> logging.LoggerAdapter:
+    """
+    Returns: A logger for a new game, which drops everything below warnings if the game isn't
+    sampled
+    """
+    extra = {"game_id": new_game_id()}
+    if _game_sample_rate < 1.0 and random.random() >= _game_sample_rate:
+        return UnsampledGameLogger(env_logger, extra)
+    return GameLoggerAdapter(env_logger, extra)
+
+
 def get_logger_with_context(extra: dict) -> logging.Logger:
-    return logging.LoggerAdapter(env_logger, extra)
+    return GameLoggerAdapter(env_logger, extra)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Formats each record as one JSON object per line, including the game id, event name and
+    event data of game records
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "process": record.process,
+            "message": record.getMessage(),
+        }
+        for field in ["game_id", "event", "data"]:
+            if hasattr(record, field):
+                entry[field] = getattr(record, field)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Never blocks the logging thread: records are dropped (and counted) if the queue is full
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        # Event data can reference env state that changes before the record is written out
+        if hasattr(record, "data"):
+            record.data = copy.deepcopy(record.data)
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def start_queue_logging(
+    handler: logging.Handler,
+    level: int = logging.INFO,
+    sample_rate: float = 1.0,
+    max_queue_size: int = 100_000,
+) -> logging.handlers.QueueListener:
+    """
+    Send env logs to `handler` from a background thread, so that slow handlers (e.g. writing to
+    files or stdout) can't throttle the env. Only a `sample_rate` fraction of games are logged.
+
+    Returns: The listener writing to `handler`, which is also stopped (flushing any queued
+    records) at exit
+    """
+    log_queue = queue.Queue(maxsize=max_queue_size)
+    env_logger.addHandler(DroppingQueueHandler(log_queue))
+    env_logger.setLevel(level)
+    set_game_sample_rate(sample_rate)
+
+    listener = logging.handlers.QueueListener(
+        log_queue, handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def stop_queue_logging(listener: logging.handlers.QueueListener):
+    """
+    Stop sending env logs to `listener`, and stop it once it has written out any queued records
+    """
+    for handler in list(env_logger.handlers):
+        if (
+            isinstance(handler, DroppingQueueHandler)
+            and handler.queue is listener.queue
+        ):
+            env_logger.removeHandler(handler)
+    atexit.unregister(listener.stop)
+    listener.stop()
@@ -0,0 +1,222 @@
+import os
+import threading
+from typing import Iterator
+
+import numpy as np
+
+# Game record files are a header followed by a flat array of fixed size plies (16 bytes each),
+# with the plies of each game stored consecutively and ending with a row for the final state
+MAGIC = b"MANCALA\x01"
+
+PLY_DTYPE = np.dtype(
+    [
+        # [player_side (1*6), player_score (1*1), opponent_side (1*6), opponent_score (1*1)],
+        # always from the perspective of the same player for the whole game
+        ("state", np.uint8, 14),
+        # bits 0-2: the action played from this state, or NO_ACTION on a game's final row
+        # bit 3: set if it was the opponent that played the action, or on a final row, if it's
+        # the opponent to move (for games that haven't finished)
+        ("move", np.uint8),
+        # the game's outcome for the player, repeated on each of the game's rows
+        ("outcome", np.int8),
+    ]
+)
+
+ACTION_MASK = 0b0111
+NO_ACTION = 0b0111
+OPPONENT_MOVE_FLAG = 0b1000
+
+WIN, DRAW, LOSE = 1, 0, -1
+# For games that were recorded before they finished, e.g. truncated episodes or single requests
+UNFINISHED = -128
+
+
+def get_outcome(final_state: np.array) -> int:
+    player_side, opponent_side = final_state[:6], final_state[7:13]
+    if player_side.sum() != 0 and opponent_side.sum() != 0:
+        return UNFINISHED
+
+    return int(np.sign(int(final_state[6]) - int(final_state[13])))
+
+
+def get_actions(plies: np.array) -> np.array:
+    return plies["move"] & ACTION_MASK
+
+
+def is_opponent_move(plies: np.array) -> np.array:
+    return (plies["move"] & OPPONENT_MOVE_FLAG) != 0
+
+
+def is_final(plies: np.array) -> np.array:
+    return (plies["move"] & ACTION_MASK) == NO_ACTION
+
+
+def _get_move(action: int, is_opponent_move: bool) -> int:
+    return action | (OPPONENT_MOVE_FLAG if is_opponent_move else 0)
+
+
+def _create_with_header(path: str):
+    """
+    Creates the file with its header if it doesn't exist. The header is written to a scratch
+    file that's then linked into place, which fails if the file exists, so that processes
+    creating the same file at once never see it without its header or write it twice.
+    """
+    if os.path.exists(path):
+        return
+
+    scratch_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(scratch_path, "wb") as f:
+        f.write(MAGIC)
+    try:
+        os.link(scratch_path, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(scratch_path)
+
+
+class GameRecordWriter:
+    """
+    Appends games to a game record file, buffering whole games in memory and writing them out
+    in bulk. Whole games can be written from several threads at once with `write_game`, while
+    `add_ply` and `end_game` build up a single game in progress, e.g. for an env.
+    """
+
+    def __init__(self, path: str, buffer_plies: int = 65_536):
+        self._buffer_plies = buffer_plies
+        self._lock = threading.Lock()
+        self._game: list[tuple] = []
+        self._buffer: list[np.array] = []
+        self._buffered = 0
+
+        _create_with_header(path)
+        with open(path, "rb") as f:
+            assert f.read(len(MAGIC)) == MAGIC, f"'{path}' is not a game record file"
+
+        # Unbuffered, so that each write of whole games is a single append, and games from
+        # several processes appending to the same file don't interleave
+        self._file = open(path, "ab", buffering=0)
+
+    def __enter__(self) -> "GameRecordWriter":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    @property
+    def has_game_in_progress(self) -> bool:
+        return len(self._game) > 0
+
+    def add_ply(self, state: np.array, action: int, is_opponent_move: bool):
+        """
+        Record the state before `action` is played from it
+        """
+        self._game.append((state, _get_move(action, is_opponent_move)))
+
+    def end_game(self, final_state: np.array, opponent_to_move: bool = False):
+        """
+        Record the game in progress, ending in `final_state` with the opponent to move in it if
+        `opponent_to_move`, which only matters for games that haven't finished
+        """
+        game, self._game = self._game, []
+        self._add_game(
+            [state for state, _ in game],
+            [move for _, move in game],
+            final_state,
+            opponent_to_move,
+        )
+
+    def write_game(
+        self,
+        states: np.array,
+        actions: np.array,
+        opponent_moves: np.array,
+        opponent_to_move: bool = False,
+    ):
+        """
+        Record a whole game at once, where `states` has one more row than there are actions
+        """
+        self._add_game(
+            states[:-1],
+            [
+                _get_move(int(action), bool(opponent_move))
+                for action, opponent_move in zip(actions, opponent_moves)
+            ],
+            states[-1],
+            opponent_to_move,
+        )
+
+    def _add_game(self, states, moves: list[int], final_state, opponent_to_move: bool):
+        game = np.empty(len(moves) + 1, dtype=PLY_DTYPE)
+        if moves:
+            game["state"][:-1] = states
+            game["move"][:-1] = moves
+        game["state"][-1] = final_state
+        game["move"][-1] = _get_move(NO_ACTION, opponent_to_move)
+        game["outcome"] = get_outcome(np.asarray(final_state))
+
+        with self._lock:
+            self._buffer.append(game)
+            self._buffered += len(game)
+            if self._buffered >= self._buffer_plies:
+                self._write_buffer()
+
+    def _write_buffer(self):
+        if self._buffer:
+            self._file.write(np.concatenate(self._buffer).tobytes())
+        self._buffer = []
+        self._buffered = 0
+
+    def flush(self):
+        with self._lock:
+            self._write_buffer()
+            self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+class GameRecordReader:
+    """
+    Memory-maps a game record file, so that it can be scanned in chunks without loading it all
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            assert f.read(len(MAGIC)) == MAGIC, f"'{path}' is not a game record file"
+
+        n_plies = (os.path.getsize(path) - len(MAGIC)) // PLY_DTYPE.itemsize
+        self.plies = (
+            np.memmap(path, dtype=PLY_DTYPE, mode="r", offset=len(MAGIC), shape=n_plies)
+            if n_plies > 0
+            else np.empty(0, dtype=PLY_DTYPE)
+        )
+
+    def __len__(self) -> int:
+        return len(self.plies)
+
+    def iter_chunks(self, chunk_plies: int = 1 << 20) -> Iterator[np.array]:
+        """
+        Returns: Consecutive chunks of roughly `chunk_plies` plies, each made up of whole games
+        """
+        start = 0
+        while start < len(self.plies):
+            stop = min(start + chunk_plies, len(self.plies))
+            final_indices = np.flatnonzero(is_final(self.plies[start:stop]))
+            if stop < len(self.plies):
+                if len(final_indices) > 0:
+                    stop = start + final_indices[-1] + 1
+                else:
+                    # A single game longer than the chunk, so extend to the end of it
+                    remaining = np.flatnonzero(is_final(self.plies[stop:]))
+                    stop = (
+                        stop + remaining[0] + 1 if len(remaining) else len(self.plies)
+                    )
+
+            yield self.plies[start:stop]
+            start = stop
+
+    def iter_games(self, chunk_plies: int = 1 << 20) -> Iterator[np.array]:
+        for chunk in self.iter_chunks(chunk_plies):
+            yield from np.split(chunk, np.flatnonzero(is_final(chunk))[:-1] + 1)
@@ -0,0 +1,130 @@
+"""
+The rules of the game on flat boards, compiled with Numba when it's installed (the `jit` extra)
+and falling back to the env's own make_valid_action otherwise.
+
+Boards are arrays laid out like observations, from the perspective of the side to move:
+[mover_side (1*6), mover_store (1*1), other_side (1*6), other_store (1*1)]. Batches of boards
+are (n, 14) arrays. Moves are applied in place, and must be legal.
+"""
+
+import numpy as np
+
+from .mancala import make_valid_action
+
+try:
+    import numba
+
+    HAS_JIT = True
+except ImportError:
+    HAS_JIT = False
+
+STORE = 6
+# Sowing goes around every position but the other side's store
+N_SOWN_POSITIONS = 13
+# Swaps the sides of boards, to get them from the other side's perspective
+FLIP_PERMUTATION = np.r_[7:14, 0:7]
+
+
+def _jit(fn):
+    return numba.njit(cache=True)(fn) if HAS_JIT else fn
+
+
+@_jit
+def _apply_move_kernel(board: np.ndarray, action: int) -> bool:
+    """
+    Play `action` for the side to move, in place.
+
+    Returns: Whether the side to move gets another turn
+    """
+    gems = board[action]
+    board[action] = 0
+    position = action
+    for _ in range(gems):
+        position = (position + 1) % N_SOWN_POSITIONS
+        board[position] += 1
+
+    # The last gem landed in an empty pit on the mover's side
+    if position < STORE and board[position] == 1:
+        opposite = 12 - position
+        board[STORE] += board[position] + board[opposite]
+        board[position] = 0
+        board[opposite] = 0
+
+    return position == STORE
+
+
+@_jit
+def _apply_moves_kernel(boards: np.ndarray, actions: np.ndarray) -> np.ndarray:
+    """
+    Play `actions[i]` on `boards[i]` for each board, in place.
+
+    Returns: Whether the side to move gets another turn, for each board
+    """
+    plays_again = np.empty(len(actions), dtype=np.bool_)
+    for i in range(len(actions)):
+        plays_again[i] = _apply_move_kernel(boards[i], actions[i])
+    return plays_again
+
+
+@_jit
+def legal_moves(board: np.ndarray) -> np.ndarray:
+    return board[:6] > 0
+
+
+@_jit
+def legal_moves_batch(boards: np.ndarray) -> np.ndarray:
+    return boards[:, :6] > 0
+
+
+@_jit
+def is_terminal(board: np.ndarray) -> bool:
+    """
+    Returns: Whether the game is over, which is when either side is empty. The gems left on the
+    other side aren't swept into its store, as in the env.
+    """
+    mover_total = 0
+    other_total = 0
+    for i in range(6):
+        mover_total += board[i]
+        other_total += board[7 + i]
+    return mover_total == 0 or other_total == 0
+
+
+@_jit
+def is_terminal_batch(boards: np.ndarray) -> np.ndarray:
+    terminal = np.empty(len(boards), dtype=np.bool_)
+    for i in range(len(boards)):
+        terminal[i] = is_terminal(boards[i])
+    return terminal
+
+
+def _apply_move_python(board: np.ndarray, action: int) -> bool:
+    mover_side, mover_score, other_side, plays_again = make_valid_action(
+        int(action), board[:6].tolist(), int(board[STORE]), board[7:13].tolist()
+    )
+    board[:6] = mover_side
+    board[STORE] = mover_score
+    board[7:13] = other_side
+    return plays_again
+
+
+def _apply_moves_python(boards: np.ndarray, actions: np.ndarray) -> np.ndarray:
+    return np.array(
+        [_apply_move_python(board, action) for board, action in zip(boards, actions)],
+        dtype=bool,
+    )
+
+
+if HAS_JIT:
+    apply_move = _apply_move_kernel
+    apply_moves = _apply_moves_kernel
+else:
+    apply_move = _apply_move_python
+    apply_moves = _apply_moves_python
+
+
+def flip(boards: np.ndarray) -> np.ndarray:
+    """
+    Returns: Copies of the board or boards from the other side's perspective
+    """
+    return boards[..., FLIP_PERMUTATION]
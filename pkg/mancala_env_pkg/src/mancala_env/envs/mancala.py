@@ -1,11 +1,12 @@
 from typing import Any, Callable
+import logging
 import numpy as np
 import gymnasium as gym
 import itertools as it
 from enum import Enum
-import uuid
 
 from . import env_logging
+from .game_record import GameRecordWriter
 
 
 class GameOutcome(Enum):
@@ -14,6 +15,14 @@ class GameOutcome(Enum):
     LOSE = "lose"
 
 
+# Rewards for the step that ends the game, as given by get_player_reward
+GAME_OVER_REWARDS = {
+    GameOutcome.WIN: 100.0,
+    GameOutcome.DRAW: 0.0,
+    GameOutcome.LOSE: -100.0,
+}
+
+
 def generate_action_sequence(action: int, total_gems: int) -> list[tuple[int, int]]:
     """
     Generate a sequence of consecutive index positions as a flattened
@@ -71,6 +80,40 @@ def make_valid_action(
     return current_state[0], current_state[1][0], current_state[2], does_play_again
 
 
+def get_outcome(score_difference: float) -> GameOutcome:
+    if score_difference > 0:
+        return GameOutcome.WIN
+    elif score_difference == 0:
+        return GameOutcome.DRAW
+    return GameOutcome.LOSE
+
+
+def get_player_reward(
+    player_score: int | np.ndarray,
+    opponent_score: int | np.ndarray,
+    is_game_over: bool | np.ndarray,
+) -> float | np.ndarray:
+    """
+    The player's reward after a step, computed elementwise when given arrays of games: the
+    GAME_OVER_REWARDS of the outcome once the game is over, and otherwise the player's lead,
+    with any deficit counting as -1
+    """
+    if isinstance(is_game_over, (bool, np.bool_)):
+        # A single game, kept in plain Python since the env computes this on every step
+        score_difference = float(player_score - opponent_score)
+        if is_game_over:
+            return GAME_OVER_REWARDS[get_outcome(score_difference)]
+        return max(score_difference, -1.0)
+
+    score_difference = np.subtract(player_score, opponent_score, dtype=float)
+    game_over_rewards = np.select(
+        [score_difference > 0, score_difference == 0],
+        [GAME_OVER_REWARDS[GameOutcome.WIN], GAME_OVER_REWARDS[GameOutcome.DRAW]],
+        GAME_OVER_REWARDS[GameOutcome.LOSE],
+    )
+    return np.where(is_game_over, game_over_rewards, np.maximum(score_difference, -1.0))
+
+
 class MancalaEnv(gym.Env):
     def __init__(
         self,
@@ -82,7 +125,10 @@ class MancalaEnv(gym.Env):
         self.metadata = {"render_modes": ["None"]}
         self.render_mode = None
 
+        # Called as opponent_policy(rng, observation) with this env's np.random.Generator and
+        # the observation from the opponent's perspective
         self._opponent_policy = opponent_policy
+        self._game_record_writer = None
 
         if is_play_mode:
             # TODO: Not actually used because inference server will run this again to supply correct initial player
@@ -95,31 +141,67 @@ class MancalaEnv(gym.Env):
         self.observation_space = gym.spaces.MultiDiscrete(np.array([49] * 14))
         self.action_space = gym.spaces.Discrete(6)
 
-    def _get_obs(self) -> np.array:
-        return np.array(
+    def _update_board_summary(self):
+        """
+        Work out everything a step reads from the board once, when the board changes, rather
+        than on each of the reads
+        """
+        self._obs = np.array(
             self._player_side
             + [self._player_score]
             + self._opponent_side
             + [self._opponent_score]
         )
+        self._player_side_total = sum(self._player_side)
+        self._opponent_side_total = sum(self._opponent_side)
+        self._game_over = self._player_side_total == 0 or self._opponent_side_total == 0
 
-    def _get_opponent_obs(self) -> np.array:
-        return np.array(
-            self._opponent_side
-            + [self._opponent_score]
-            + self._player_side
-            + [self._player_score]
+        self._outcome = get_outcome(self._player_score - self._opponent_score)
+        self._reward = get_player_reward(
+            self._player_score, self._opponent_score, self._game_over
         )
 
+    def _get_obs(self) -> np.array:
+        """
+        Returns: The current observation, which is shared between calls until the board next
+        changes, so must not be modified
+        """
+        return self._obs
+
+    def _get_opponent_obs(self) -> np.array:
+        return np.concatenate((self._obs[7:], self._obs[:7]))
+
     def _get_info(self) -> dict:
-        info = {}
-        info["is_success"] = self._current_game_outcome == GameOutcome.WIN
-        info["is_draw"] = self._current_game_outcome == GameOutcome.DRAW
-        info["is_loss"] = self._current_game_outcome == GameOutcome.LOSE
+        return {
+            "is_success": self._outcome == GameOutcome.WIN,
+            "is_draw": self._outcome == GameOutcome.DRAW,
+            "is_loss": self._outcome == GameOutcome.LOSE,
+        }
 
-        return info
+    def record_games_to(self, writer: GameRecordWriter):
+        """
+        Record every move played from now on to `writer`, as games in the game record format
+        """
+        self._game_record_writer = writer
+
+    def end_game_record(self):
+        """
+        Record the game in progress as unfinished, if there is one
+        """
+        if (
+            self._game_record_writer is not None
+            and self._game_record_writer.has_game_in_progress
+        ):
+            self._game_record_writer.end_game(
+                self._get_obs(), opponent_to_move=not self._is_player_turn
+            )
 
     def _make_entity_action(self, action: int, is_player: bool) -> bool:
+        if self._game_record_writer is not None:
+            self._game_record_writer.add_ply(
+                self._get_obs(), action, is_opponent_move=not is_player
+            )
+
         if is_player:
             self._player_side, self._player_score, self._opponent_side, plays_again = (
                 make_valid_action(
@@ -136,43 +218,29 @@ class MancalaEnv(gym.Env):
                 action, self._opponent_side, self._opponent_score, self._player_side
             )
 
+        self._update_board_summary()
         self._record()
 
+        if self._game_record_writer is not None and self._game_over:
+            self._game_record_writer.end_game(self._get_obs())
+
         return plays_again
 
     def _is_game_over(self) -> bool:
-        if sum(self._player_side) == 0 or sum(self._opponent_side) == 0:
-            return True
-
-        return False
+        return self._game_over
 
     @property
-    def _current_game_outcome(self) -> str:
-        if self._player_score > self._opponent_score:
-            return GameOutcome.WIN
-
-        if self._player_score == self._opponent_score:
-            return GameOutcome.DRAW
-
-        return GameOutcome.LOSE
+    def _current_game_outcome(self) -> GameOutcome:
+        return self._outcome
 
     def _get_player_reward(self) -> float:
-        if not self._is_game_over():
-            return max(self._player_score - self._opponent_score, -1.0)
-
-        if self._current_game_outcome == GameOutcome.WIN:
-            return 100.0
-
-        if self._current_game_outcome == GameOutcome.DRAW:
-            return 0
-
-        return -100.0
+        return self._reward
 
     def _opponent_takes_turn_if_not_game_over(self):
         plays_again = True
-        while plays_again and not self._is_game_over():
+        while plays_again and not self._game_over:
             opponent_action = self._opponent_policy(
-                self._seed, self._get_opponent_obs()
+                self.np_random, self._get_opponent_obs()
             )
             assert self._is_opponent_action_valid(
                 opponent_action
@@ -181,17 +249,19 @@ class MancalaEnv(gym.Env):
         self._is_player_turn = True
 
     def step(self, action: int) -> tuple[list[int], float, bool, bool, dict]:
-        assert (
-            not self._is_game_over()
-        ), "attempting to step game even though game is over"
+        assert not self._game_over, "attempting to step game even though game is over"
 
         # No state change happens on invalid moves, but a negative reward is received
         # Truncate after 10 consecutive invalid actions
         if not self._is_player_action_valid(action):
-            self.logger.info(f"player attempted invalid action: '{action}'")
+            self.logger.info(
+                "player attempted invalid action: '%s'",
+                action,
+                extra={"event": "invalid_action", "data": {"action": action}},
+            )
             self._invalid_count += 1
             return (
-                self._get_obs(),
+                self._obs,
                 -1.0,
                 False,
                 self._invalid_count >= 10,
@@ -209,27 +279,36 @@ class MancalaEnv(gym.Env):
                 "only player will play on this step since they get to take an extra turn"
             )
 
-        self.logger.debug(self.get_serialised_form())
-        if self._is_game_over():
-            self.logger.info("finished a game")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(
+                "step '%s' complete",
+                self._valid_step_count,
+                extra={"event": "step", "data": self.get_serialised_form()},
+            )
+        if self._game_over:
+            self.logger.info(
+                "finished a game",
+                extra={
+                    "event": "game_finished",
+                    "data": {
+                        "outcome": self._outcome.value,
+                        "player_score": self._player_score,
+                        "opponent_score": self._opponent_score,
+                        "valid_steps": self._valid_step_count + 1,
+                    },
+                },
+            )
 
-        self.logger.debug(f"step '{self._valid_step_count}' complete")
         self._valid_step_count += 1
-        return (
-            self._get_obs(),
-            self._get_player_reward(),
-            self._is_game_over(),
-            False,
-            self._get_info(),
-        )
+        return self._obs, self._reward, self._game_over, False, self._get_info()
 
     def step_in_play_mode(self, action: int):
-        assert (
-            not self._is_game_over()
-        ), "Attempting to step game even though game is over"
+        assert not self._game_over, "Attempting to step game even though game is over"
 
-        assert self._is_player_action_valid(
-            action
+        assert (
+            self._is_player_action_valid(action)
+            if self._is_player_turn
+            else self._is_opponent_action_valid(action)
         ), "the action sent to step the env during play is invalid"
 
         if self._is_player_turn:
@@ -250,9 +329,9 @@ class MancalaEnv(gym.Env):
         return self._opponent_side[action] > 0
 
     def _set_seed(self, seed: int):
-        self._seed = seed
+        # Only seeds this env's own generator, which it also passes to the opponent policy, so
+        # that envs in the same process don't share random state
         super().reset(seed=seed)
-        np.random.seed(seed)
 
     def get_serialised_form(self) -> dict:
         return {
@@ -261,21 +340,33 @@ class MancalaEnv(gym.Env):
             "player_score": self._player_score,
             "opponent_score": self._opponent_score,
             "opponent_to_start": not self._is_player_turn,
-            "is_game_over": self._is_game_over(),
+            "is_game_over": self._game_over,
         }
 
+    def _set_board_state(
+        self,
+        player_side: list[int],
+        player_score: int,
+        opponent_side: list[int],
+        opponent_score: int,
+    ):
+        self._player_side = player_side
+        self._player_score = player_score
+        self._opponent_side = opponent_side
+        self._opponent_score = opponent_score
+        self._update_board_summary()
+
     def _deserialise(self, serialised_form: dict) -> bool:
-        self._player_side = serialised_form.player_side
-        self._opponent_side = serialised_form.opponent_side
-        self._player_score = serialised_form.player_score
-        self._opponent_score = serialised_form.opponent_score
+        self._set_board_state(
+            serialised_form.player_side,
+            serialised_form.player_score,
+            serialised_form.opponent_side,
+            serialised_form.opponent_score,
+        )
         return not serialised_form.opponent_to_start
 
     def _set_board_initial_state(self):
-        self._player_side = [4] * 6
-        self._opponent_side = [4] * 6
-        self._player_score = 0
-        self._opponent_score = 0
+        self._set_board_state([4] * 6, 0, [4] * 6, 0)
 
     def _start_new_history(self):
         self._valid_step_count = 0
@@ -284,24 +375,41 @@ class MancalaEnv(gym.Env):
         # record initial env state
         self._record()
 
+    def _log_initial_state(self):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(
+                "initial state",
+                extra={"event": "initial_state", "data": self.get_serialised_form()},
+            )
+
     def start_in_play_mode_initial(self, is_player_turn: bool):
-        self.logger = env_logging.get_logger_with_context({"game_id": uuid.uuid4()})
+        self.end_game_record()
+        self.logger = env_logging.get_game_logger()
         self._set_board_initial_state()
         self._start_new_history()
         self._is_player_turn = is_player_turn
-        self.logger.info("starting Mancala in play mode from start")
-        self.logger.debug(f"Initial state: '{self.get_serialised_form()}'")
+        self.logger.info(
+            "starting Mancala in play mode from start", extra={"event": "game_started"}
+        )
+        self._log_initial_state()
 
     def start_in_play_mode_midgame(self, game_state: dict):
-        self.logger = env_logging.get_logger_with_context({"game_id": uuid.uuid4()})
+        self.end_game_record()
+        self.logger = env_logging.get_game_logger()
         self._is_player_turn = self._deserialise(game_state)
         self._start_new_history()
-        self.logger.info("starting Mancala in play mode from midgame")
-        self.logger.debug(f"Initial state: '{self.get_serialised_form()}'")
+        self.logger.info(
+            "starting Mancala in play mode from midgame",
+            extra={"event": "game_started"},
+        )
+        self._log_initial_state()
 
     def reset(self, seed: int = None, options: Any = None) -> tuple[list[int], dict]:
-        # Set a new logger uuid
-        self.logger = env_logging.get_logger_with_context({"game_id": uuid.uuid4()})
+        # Games cut short, e.g. by truncation, are still recorded but marked unfinished
+        self.end_game_record()
+
+        # Each game gets a new id, and is sampled for logging or not
+        self.logger = env_logging.get_game_logger()
         self._set_seed(seed)
 
         self._set_board_initial_state()
@@ -313,7 +421,7 @@ class MancalaEnv(gym.Env):
         if not self._is_player_turn:
             self._opponent_takes_turn_if_not_game_over()
 
-        self.logger.debug(f"Initial state: '{self.get_serialised_form()}'")
+        self._log_initial_state()
         return self._get_obs(), {}
 
     def _record(self):
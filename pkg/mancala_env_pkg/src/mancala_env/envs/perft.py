@@ -0,0 +1,252 @@
+"""
+Perft: counts every position reachable from a position within a number of moves, by applying
+each legal move at each depth. The counts only depend on the rules, so two implementations of
+the rules that disagree on any count disagree on some move, and the time taken is a measure of
+how fast an implementation plays moves.
+
+Search is breadth first over batches of boards (laid out as in the kernel) from the perspective
+of the side to move. With transpositions, boards reached by different sequences of moves are
+merged and expanded once, weighted by the number of sequences reaching them.
+"""
+
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+
+from . import kernel
+
+# Ways of applying a batch of moves in place, returning whether each mover plays again
+ENGINES = {
+    "make_valid_action": kernel._apply_moves_python,
+    "kernel": kernel.apply_moves,
+}
+
+START_BOARD = np.array([4] * 6 + [0] + [4] * 6 + [0], dtype=np.uint8)
+
+
+@dataclass
+class PerftResult:
+    # For each depth from 0, the number of move sequences of that length, the number of those
+    # that end the game, and the number of distinct positions they reach. Positions are only
+    # counted with transpositions and before the search is split, and are None otherwise.
+    nodes: list[int]
+    terminal: list[int]
+    positions: list[int | None]
+    # Moves the engine applied, fewer than the nodes counted when transpositions are merged
+    moves_applied: int
+    elapsed: float = 0.0
+
+    def add(self, other: "PerftResult", offset: int):
+        """
+        Adds the counts of a search started `offset` moves deeper than this one
+        """
+        for d in range(len(other.nodes)):
+            self.nodes[offset + d] += other.nodes[d]
+            self.terminal[offset + d] += other.terminal[d]
+            self.positions[offset + d] = None
+        self.moves_applied += other.moves_applied
+
+
+def _empty_result(depth: int) -> PerftResult:
+    return PerftResult(
+        nodes=[0] * (depth + 1),
+        terminal=[0] * (depth + 1),
+        positions=[None] * (depth + 1),
+        moves_applied=0,
+    )
+
+
+@lru_cache(maxsize=None)
+def _get_binomials(n_max: int, k_max: int) -> np.ndarray:
+    """
+    Returns: A table of n choose k for n up to `n_max` and k up to `k_max`
+    """
+    binomials = np.zeros((n_max + 1, k_max + 1), dtype=np.uint64)
+    for n in range(n_max + 1):
+        for k in range(min(n, k_max) + 1):
+            binomials[n, k] = math.comb(n, k)
+    return binomials
+
+
+def _get_keys(boards: np.ndarray) -> np.ndarray:
+    """
+    Moves never add or remove gems, so every board of a search is one way of splitting the same
+    total between its 14 positions. Each way is numbered exactly by the 13 bars between its
+    positions, when laid out in a row with the gems, as a combination in the combinatorial
+    number system. That fits in 64 bits, and integers sort far faster than rows of bytes.
+
+    Returns: A distinct integer for each distinct board
+    """
+    n_positions = boards.shape[1]
+    binomials = _get_binomials(int(boards[0].sum()) + n_positions - 1, n_positions - 1)
+    # Column by column, since the boards are many and short. The i'th bar comes after the gems
+    # of the first i + 1 positions and the i bars before it.
+    bar = np.full(len(boards), -1, dtype=np.intp)
+    keys = np.zeros(len(boards), dtype=np.uint64)
+    for i in range(n_positions - 1):
+        bar += boards[:, i]
+        bar += 1
+        keys += binomials[:, i + 1][bar]
+    return keys
+
+
+def _merge_transpositions(
+    boards: np.ndarray, counts: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    if len(boards) == 0:
+        return boards, counts
+
+    keys = _get_keys(boards)
+    order = np.argsort(keys)
+    keys = keys[order]
+    is_first = np.empty(len(keys), dtype=bool)
+    is_first[:1] = True
+    np.not_equal(keys[1:], keys[:-1], out=is_first[1:])
+    firsts = np.flatnonzero(is_first)
+    return boards[order[firsts]], np.add.reduceat(counts[order], firsts)
+
+
+def _expand(
+    boards: np.ndarray, counts: np.ndarray, engine: str
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns: Every position after each legal move of each (non-terminal) board, and the number
+    of sequences of moves reaching each
+    """
+    parents, actions = np.nonzero(kernel.legal_moves_batch(boards))
+    children = boards[parents]
+    plays_again = ENGINES[engine](children, actions)
+    children[~plays_again] = kernel.flip(children[~plays_again])
+    return children, counts[parents]
+
+
+def _search(
+    boards: np.ndarray,
+    counts: np.ndarray,
+    depth: int,
+    engine: str,
+    transpositions: bool,
+    max_frontier: int,
+    executor: ProcessPoolExecutor | None = None,
+    n_chunks: int = 1,
+) -> PerftResult:
+    """
+    Searches `depth` moves from each of the boards. Whenever there are more than `max_frontier`
+    boards, they're split into chunks searched one after another, to bound memory use. With an
+    executor, the boards are instead split into `n_chunks` chunks searched in parallel as soon
+    as there are enough of them to share out.
+    """
+    result = _empty_result(depth)
+    for d in range(depth + 1):
+        is_over = kernel.is_terminal_batch(boards)
+        result.nodes[d] = int(counts.sum())
+        result.terminal[d] = int(counts[is_over].sum())
+        result.positions[d] = len(boards) if transpositions else None
+        if d == depth:
+            break
+
+        boards, counts = boards[~is_over], counts[~is_over]
+        if executor is not None and len(boards) >= 4 * n_chunks:
+            chunks = np.array_split(np.arange(len(boards)), n_chunks)
+            jobs = [
+                executor.submit(
+                    _search_children,
+                    boards[chunk],
+                    counts[chunk],
+                    depth - d - 1,
+                    engine,
+                    transpositions,
+                    max_frontier,
+                )
+                for chunk in chunks
+            ]
+            for job in jobs:
+                result.add(job.result(), offset=d + 1)
+            break
+
+        if len(boards) > max_frontier:
+            for start in range(0, len(boards), max_frontier):
+                chunk = slice(start, start + max_frontier)
+                result.add(
+                    _search_children(
+                        boards[chunk],
+                        counts[chunk],
+                        depth - d - 1,
+                        engine,
+                        transpositions,
+                        max_frontier,
+                    ),
+                    offset=d + 1,
+                )
+            break
+
+        boards, counts = _expand(boards, counts, engine)
+        result.moves_applied += len(boards)
+        if transpositions:
+            boards, counts = _merge_transpositions(boards, counts)
+
+    return result
+
+
+def _search_children(
+    boards: np.ndarray,
+    counts: np.ndarray,
+    depth: int,
+    engine: str,
+    transpositions: bool,
+    max_frontier: int,
+) -> PerftResult:
+    """
+    Searches `depth` moves from each of the positions after each move from the boards
+    """
+    children, counts = _expand(boards, counts, engine)
+    if transpositions:
+        children, counts = _merge_transpositions(children, counts)
+    result = _search(children, counts, depth, engine, transpositions, max_frontier)
+    result.moves_applied += len(children)
+    return result
+
+
+def perft(
+    board: np.ndarray = START_BOARD,
+    depth: int = 8,
+    engine: str = "kernel",
+    transpositions: bool = True,
+    n_workers: int = 1,
+    max_frontier: int = 1 << 20,
+) -> PerftResult:
+    """
+    Counts the move sequences and positions within `depth` moves of `board`, from the
+    perspective of the side to move. With several workers, the positions at the first depth
+    with enough of them to share out are split between worker processes, which each search
+    their share with their own transpositions.
+
+    Returns: The counts at each depth, and the time taken
+    """
+    assert engine in ENGINES, f"unknown engine '{engine}'"
+    start = time.perf_counter()
+    boards = np.array(board, dtype=np.uint8).reshape(1, -1)
+    counts = np.ones(1, dtype=np.int64)
+
+    if n_workers <= 1:
+        result = _search(boards, counts, depth, engine, transpositions, max_frontier)
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            result = _search(
+                boards,
+                counts,
+                depth,
+                engine,
+                transpositions,
+                max_frontier,
+                executor=executor,
+                # More chunks than workers, so a slow chunk doesn't leave the others idle
+                n_chunks=4 * n_workers,
+            )
+
+    result.elapsed = time.perf_counter() - start
+    return result
@@ -0,0 +1,20 @@
+import io
+import logging
+
+from mancala_env.envs import env_logging
+
+
+def test_queue_logging_restarts_cleanly():
+    # As when a server's lifespan runs more than once in a process
+    for run in range(2):
+        stream = io.StringIO()
+        listener = env_logging.start_queue_logging(logging.StreamHandler(stream))
+        env_logging.env_logger.info(f"run {run}")
+        env_logging.stop_queue_logging(listener)
+
+        assert stream.getvalue() == f"run {run}\n"
+
+    assert not any(
+        isinstance(handler, env_logging.DroppingQueueHandler)
+        for handler in env_logging.env_logger.handlers
+    )
@@ -0,0 +1,157 @@
+import multiprocessing
+import sys
+import threading
+
+import numpy as np
+
+import mancala_env.envs.mancala as mancala
+import mancala_env.envs.game_record as game_record
+
+
+def first_valid_move(rng, observation):
+    return int(np.flatnonzero(observation[:6])[0])
+
+
+def play_recorded_games(path, n_games):
+    game = mancala.MancalaEnv(
+        opponent_policy=first_valid_move, seed=42, is_play_mode=False
+    )
+    with game_record.GameRecordWriter(path) as writer:
+        game.record_games_to(writer)
+        for _ in range(n_games):
+            game.reset()
+            terminated = truncated = False
+            while not (terminated or truncated):
+                obs, _, terminated, truncated, _ = game.step(
+                    first_valid_move(None, game._get_obs())
+                )
+    return game
+
+
+def test_records_round_trip(tmp_path):
+    path = tmp_path / "games.bin"
+    game = play_recorded_games(path, n_games=5)
+
+    reader = game_record.GameRecordReader(path)
+    games = list(reader.iter_games(chunk_plies=7))
+    assert len(games) == 5
+    assert reader.plies.dtype.itemsize == 16
+
+    final = games[-1][-1]
+    assert game_record.is_final(games[-1])[-1]
+    assert final["state"].tolist() == game._get_obs().tolist()
+    assert final["outcome"] == game_record.get_outcome(game._get_obs())
+
+
+def test_records_replay_with_rules(tmp_path):
+    path = tmp_path / "games.bin"
+    play_recorded_games(path, n_games=3)
+
+    for plies in game_record.GameRecordReader(path).iter_games():
+        for ply, next_ply in zip(plies[:-1], plies[1:]):
+            state = ply["state"].astype(int)
+            action = int(game_record.get_actions(ply))
+            if game_record.is_opponent_move(ply):
+                opponent_side, opponent_score, player_side, _ = (
+                    mancala.make_valid_action(
+                        action, state[7:13].tolist(), state[13], state[:6].tolist()
+                    )
+                )
+                player_score = state[6]
+            else:
+                player_side, player_score, opponent_side, _ = mancala.make_valid_action(
+                    action, state[:6].tolist(), state[6], state[7:13].tolist()
+                )
+                opponent_score = state[13]
+
+            assert (
+                player_side + [player_score] + opponent_side + [opponent_score]
+                == next_ply["state"].tolist()
+            )
+
+
+def _write_games_at_once(path, barrier, n_games):
+    barrier.wait()
+    with game_record.GameRecordWriter(path) as writer:
+        for _ in range(n_games):
+            states = np.array([[4] * 6 + [0] + [4] * 6 + [0]] * 2, dtype=np.uint8)
+            writer.write_game(states, actions=np.array([0]), opponent_moves=[False])
+
+
+def test_processes_share_a_new_file(tmp_path):
+    path = tmp_path / "games.bin"
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(4)
+    processes = [
+        context.Process(target=_write_games_at_once, args=(path, barrier, 10))
+        for _ in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    # One header, followed by every process's games
+    games = list(game_record.GameRecordReader(path).iter_games())
+    assert len(games) == 40
+    assert all(len(game) == 2 for game in games)
+
+
+def test_records_whose_turn_it_is_in_unfinished_games(tmp_path):
+    path = tmp_path / "games.bin"
+    game = mancala.MancalaEnv(
+        opponent_policy=first_valid_move, seed=42, is_play_mode=True
+    )
+    with game_record.GameRecordWriter(path) as writer:
+        game.record_games_to(writer)
+        game.start_in_play_mode_initial(is_player_turn=True)
+        # Lands short of the store, so it's then the opponent's turn
+        game.step_in_play_mode(0)
+        game.end_game_record()
+        writer.write_game(
+            np.array([game._get_obs()] * 2),
+            actions=np.array([1]),
+            opponent_moves=[True],
+            opponent_to_move=False,
+        )
+
+    first, second = game_record.GameRecordReader(path).iter_games()
+    assert first["outcome"][-1] == game_record.UNFINISHED
+    assert game_record.is_final(first).tolist() == [False, True]
+    assert game_record.is_opponent_move(first).tolist() == [False, True]
+    assert game_record.is_opponent_move(second).tolist() == [True, False]
+
+
+def test_threads_share_a_writer(tmp_path):
+    path = tmp_path / "games.bin"
+    with game_record.GameRecordWriter(path, buffer_plies=64) as writer:
+
+        def write_games(n_plies):
+            states = np.array([[4] * 6 + [0] + [4] * 6 + [0]] * n_plies, dtype=np.uint8)
+            for _ in range(500):
+                writer.write_game(
+                    states,
+                    actions=np.full(n_plies - 1, n_plies),
+                    opponent_moves=np.zeros(n_plies - 1),
+                )
+
+        threads = [threading.Thread(target=write_games, args=(n,)) for n in (2, 3, 4)]
+        # Switching between threads as often as possible, so that they'd interleave
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+    # Each game is whole, with only its own thread's plies
+    games = list(game_record.GameRecordReader(path).iter_games())
+    assert len(games) == 1500
+    assert all(
+        game_record.get_actions(game[:-1]).tolist() == [len(game)] * (len(game) - 1)
+        for game in games
+    )
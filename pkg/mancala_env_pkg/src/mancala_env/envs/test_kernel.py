@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+import mancala_env.envs.kernel as kernel
+import mancala_env.envs.mancala as mancala
+
+# The compiled kernel, its uncompiled source, and the env's rules through the same interface
+APPLY_MOVE_IMPLEMENTATIONS = {
+    "kernel": kernel._apply_move_kernel,
+    "kernel_python": getattr(
+        kernel._apply_move_kernel, "py_func", kernel._apply_move_kernel
+    ),
+    "make_valid_action": kernel._apply_move_python,
+}
+
+
+def apply_move_with_make_valid_action(board, action):
+    side, score, other_side, plays_again = mancala.make_valid_action(
+        action, board[:6].tolist(), int(board[6]), board[7:13].tolist()
+    )
+    return side + [score] + other_side + [int(board[13])], plays_again
+
+
+def random_positions(n_games, seed):
+    """
+    Returns: Every position from random games played with the env's rules, from the
+    perspective of the side to move
+    """
+    rng = np.random.default_rng(seed)
+    positions = []
+    for _ in range(n_games):
+        board = np.array([4] * 6 + [0] + [4] * 6 + [0])
+        while not (board[:6].sum() == 0 or board[7:13].sum() == 0):
+            positions.append(board.copy())
+            action = int(rng.choice(np.flatnonzero(board[:6])))
+            next_board, plays_again = apply_move_with_make_valid_action(board, action)
+            board = np.array(next_board)
+            if not plays_again:
+                board = kernel.flip(board)
+        positions.append(board.copy())
+    return positions
+
+
+@pytest.mark.parametrize("implementation", APPLY_MOVE_IMPLEMENTATIONS)
+@pytest.mark.parametrize("dtype", [np.int64, np.uint8])
+def test_apply_move_parity(implementation, dtype):
+    apply_move = APPLY_MOVE_IMPLEMENTATIONS[implementation]
+    for position in random_positions(n_games=200, seed=0):
+        for action in np.flatnonzero(position[:6]):
+            expected_board, expected_plays_again = apply_move_with_make_valid_action(
+                position, int(action)
+            )
+            board = position.astype(dtype)
+            plays_again = apply_move(board, int(action))
+            assert board.tolist() == expected_board
+            assert plays_again == expected_plays_again
+
+
+def test_batched_parity():
+    positions = np.array(random_positions(n_games=200, seed=1))
+    positions = positions[~kernel.is_terminal_batch(positions)]
+    rng = np.random.default_rng(1)
+    actions = np.array(
+        [rng.choice(np.flatnonzero(position[:6])) for position in positions]
+    )
+
+    boards = positions.copy()
+    plays_again = kernel.apply_moves(boards, actions)
+    python_boards = positions.copy()
+    python_plays_again = kernel._apply_moves_python(python_boards, actions)
+
+    assert (boards == python_boards).all()
+    assert (plays_again == python_plays_again).all()
+
+
+def test_legal_moves_and_terminal():
+    positions = np.array(random_positions(n_games=50, seed=2))
+    terminal = kernel.is_terminal_batch(positions)
+    legal = kernel.legal_moves_batch(positions)
+
+    for position, is_terminal, is_legal in zip(positions, terminal, legal):
+        side, other_side = position[:6].tolist(), position[7:13].tolist()
+        assert is_terminal == kernel.is_terminal(position)
+        assert is_terminal == (sum(side) == 0 or sum(other_side) == 0)
+        assert is_legal.tolist() == kernel.legal_moves(position).tolist()
+        assert np.flatnonzero(is_legal).tolist() == [
+            action for action, gems in enumerate(side) if gems > 0
+        ]
@@ -1,3 +1,5 @@
+import numpy as np
+
 import mancala_env.envs.mancala as mancala
 
 
@@ -8,3 +10,85 @@ def test_starting_state():
     assert game.history[-1]["player-score"] == 0
     assert game.history[-1]["opponent-side"] == [4] * 6
     assert game.history[-1]["opponent-score"] == 0
+
+
+def test_player_reward():
+    assert mancala.get_player_reward(3, 1, False) == 2.0
+    assert mancala.get_player_reward(1, 30, False) == -1.0
+    assert mancala.get_player_reward(30, 18, True) == 100.0
+    assert mancala.get_player_reward(24, 24, True) == 0.0
+    assert mancala.get_player_reward(18, 30, True) == -100.0
+    assert mancala.get_player_reward(
+        [3, 30, 18], [1, 18, 30], [False, True, True]
+    ).tolist() == [2.0, 100.0, -100.0]
+
+
+def test_player_reward_of_single_games_matches_batches():
+    rng = np.random.default_rng(0)
+    player_scores, opponent_scores = rng.integers(0, 48, size=(2, 200))
+    is_game_over = rng.random(200) < 0.5
+    batch = mancala.get_player_reward(player_scores, opponent_scores, is_game_over)
+    for i in range(200):
+        assert batch[i] == mancala.get_player_reward(
+            int(player_scores[i]), int(opponent_scores[i]), bool(is_game_over[i])
+        )
+
+
+def test_step_result_matches_board():
+    def first_valid_move(rng, observation):
+        return int(np.flatnonzero(observation[:6])[0])
+
+    game = mancala.MancalaEnv(
+        opponent_policy=first_valid_move, seed=42, is_play_mode=False
+    )
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        obs, _ = game.reset()
+        terminated = truncated = False
+        while not (terminated or truncated):
+            action = int(rng.choice(np.flatnonzero(obs[:6])))
+            obs, reward, terminated, truncated, info = game.step(action)
+
+            board = game.get_serialised_form()
+            assert obs.tolist() == (
+                board["player_side"]
+                + [board["player_score"]]
+                + board["opponent_side"]
+                + [board["opponent_score"]]
+            )
+            is_game_over = (
+                sum(board["player_side"]) == 0 or sum(board["opponent_side"]) == 0
+            )
+            assert terminated == is_game_over
+            assert reward == mancala.get_player_reward(
+                board["player_score"], board["opponent_score"], is_game_over
+            )
+            score_difference = board["player_score"] - board["opponent_score"]
+            assert info["is_success"] == (score_difference > 0)
+            assert info["is_draw"] == (score_difference == 0)
+            assert info["is_loss"] == (score_difference < 0)
+
+
+def test_seeded_games_are_reproducible():
+    def random_valid_move(rng, observation):
+        return int(rng.choice(np.flatnonzero(observation[:6])))
+
+    def play_game(seed):
+        game = mancala.MancalaEnv(
+            opponent_policy=random_valid_move, seed=None, is_play_mode=False
+        )
+        obs, _ = game.reset(seed=seed)
+        observations = [obs.tolist()]
+        terminated = truncated = False
+        while not (terminated or truncated):
+            obs, _, terminated, truncated, _ = game.step(
+                random_valid_move(game.np_random, obs)
+            )
+            observations.append(obs.tolist())
+        return observations
+
+    global_state = np.random.get_state()[1].copy()
+    assert play_game(seed=1) == play_game(seed=1)
+    assert play_game(seed=1) != play_game(seed=2)
+    # The env and its opponent only use the env's own generator
+    assert (np.random.get_state()[1] == global_state).all()
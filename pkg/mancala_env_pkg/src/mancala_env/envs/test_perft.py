@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from mancala_env.envs.perft import ENGINES, perft
+
+# From the start, 5 of the 6 first moves pass the turn to 6 replies, and sowing the 3rd pit
+# ends in the store for another turn with the other 5 pits
+START_NODES = [1, 6, 35, 185, 942, 4685, 23169]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("transpositions", [True, False])
+def test_start_counts(engine, transpositions):
+    result = perft(depth=6, engine=engine, transpositions=transpositions)
+    assert result.nodes == START_NODES
+    assert result.terminal == [0] * 7
+
+
+def test_split_searches_count_the_same():
+    expected = perft(depth=7)
+    assert expected.positions[-1] is not None
+
+    for result in [perft(depth=7, max_frontier=100), perft(depth=7, n_workers=2)]:
+        assert result.nodes == expected.nodes
+        assert result.terminal == expected.terminal
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_game_ends_after_extra_turn(engine):
+    # Sowing the last pit ends in the store, which would be another turn if the side to move
+    # had any gems left
+    board = np.array([0, 0, 0, 0, 0, 1, 20, 1, 0, 0, 0, 0, 0, 26])
+    result = perft(board, depth=3, engine=engine)
+    assert result.nodes == [1, 1, 0, 0]
+    assert result.terminal == [0, 1, 0, 0]